@@ -1,11 +1,19 @@
 from __future__ import annotations
-from typing import Optional, Dict
+from typing import AsyncIterator, Optional, Dict
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from ..gemini.gemini_client import _call_gemini_api
+from ..gemini.admission import llm_status
+from ..gemini.gemini_client import call_gemini_api_async, stream_gemini_api_async
 
 router = APIRouter()
 
+FALLBACK_REPLY = (
+    "I hear you—thanks for sharing. Based on your message, consider rest, hydration, and noting your key symptoms. "
+    "If symptoms persist beyond 48–72 hours, or you notice warning signs (severe pain, trouble breathing, confusion), seek in-person care."
+)
+
 
 class ChatRequest(BaseModel):
     text: str
@@ -13,28 +21,62 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     reply: str
+    llm_status: Optional[str] = None
 
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest) -> ChatResponse:
-    """Simple AI Doctor chat endpoint. Uses Gemini if configured, otherwise returns a supportive fallback.
-    """
-    text = (req.text or "").strip()
-    if not text:
-        raise HTTPException(status_code=400, detail="text is required")
-
-    prompt = (
+def _chat_prompt(text: str) -> str:
+    return (
         "You are a supportive, concise virtual clinician. Respond empathetically and clearly to the user's message.\n"
         "Offer 2–3 practical next steps and safety red flags when appropriate.\n"
         f"User: {text}\n"
         "Assistant:"
     )
 
-    ai = _call_gemini_api(prompt)
+
+def _clean_text(req: ChatRequest) -> str:
+    text = (req.text or "").strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="text is required")
+    return text
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest) -> ChatResponse:
+    """Simple AI Doctor chat endpoint. Uses Gemini if configured, otherwise returns a supportive fallback.
+    """
+    text = _clean_text(req)
+    ai = await call_gemini_api_async(_chat_prompt(text))
     if not ai:
         # Fallback mock reply
-        ai = (
-            "I hear you—thanks for sharing. Based on your message, consider rest, hydration, and noting your key symptoms. "
-            "If symptoms persist beyond 48–72 hours, or you notice warning signs (severe pain, trouble breathing, confusion), seek in-person care."
-        )
-    return ChatResponse(reply=ai)
+        ai = FALLBACK_REPLY
+    return ChatResponse(reply=ai, llm_status=llm_status())
+
+
+def _sse(data: Dict[str, Optional[str]], event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+async def _chat_events(text: str) -> AsyncIterator[str]:
+    chunks = []
+    async for chunk in stream_gemini_api_async(_chat_prompt(text)):
+        chunks.append(chunk)
+        yield _sse({"delta": chunk})
+    if not chunks:
+        # Degraded path: Gemini unavailable, send the fallback reply in one piece
+        chunks.append(FALLBACK_REPLY)
+        yield _sse({"delta": FALLBACK_REPLY})
+    yield _sse({"reply": "".join(chunks).strip(), "llm_status": llm_status()}, event="done")
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest) -> StreamingResponse:
+    """Streaming variant of /chat as Server-Sent Events.
+    Emits `data: {"delta": ...}` events as tokens arrive, then `event: done` with the full reply.
+    """
+    text = _clean_text(req)
+    return StreamingResponse(
+        _chat_events(text),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,18 @@
 from __future__ import annotations
+import asyncio
 import os
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from ..schemas.auth import SignupRequest, LoginRequest, AuthResponse, UserOut
 from ..utils.state import save_user, get_user_by_email
-
-# Password hashing
-try:  # pragma: no cover
-    from passlib.context import CryptContext  # type: ignore
-    _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-except Exception:  # pragma: no cover
-    _pwd_context = None  # type: ignore
-
-import hashlib
+from ..utils.passwords import HashPoolBusy, hash_password_async, needs_rehash, verify_password_async
+from ..utils.cache import TTLCache
+from ..utils.metrics import register_cache
 
 # JWT
 try:  # pragma: no cover
@@ -27,19 +25,6 @@ ALGORITHM = "HS256"
 router = APIRouter()
 
 
-def hash_password(password: str) -> str:
-    if _pwd_context:
-        return _pwd_context.hash(password)
-    # Fallback SHA256 (less secure; for local-only dev)
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
-
-
-def verify_password(password: str, hashed: str) -> bool:
-    if _pwd_context:
-        return _pwd_context.verify(password, hashed)
-    return hashlib.sha256(password.encode("utf-8")).hexdigest() == hashed
-
-
 def create_access_token(data: Dict[str, Any], expires_minutes: int = 60) -> str:
     secret = os.getenv("SECRET_KEY", "dev-secret-key")
     to_encode = data.copy()
@@ -51,28 +36,126 @@ def create_access_token(data: Dict[str, Any], expires_minutes: int = 60) -> str:
     return f"mock-{uuid.uuid4()}"
 
 
+# Verified-token cache: claims of tokens that already passed signature and
+# expiry checks, keyed by the raw token. An entry never outlives the token's
+# own `exp`, and AUTH_TOKEN_CACHE_TTL_S caps how long a token goes without
+# being re-verified (AUTH_TOKEN_CACHE_SIZE=0 disables caching).
+_token_cache: Optional[TTLCache] = None
+_token_cache_lock = threading.Lock()
+
+
+def _get_token_cache() -> TTLCache:
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = TTLCache(
+                    max_entries=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096")),
+                    ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL_S", "300")),
+                )
+    return _token_cache
+
+
+register_cache("auth_token", lambda: _get_token_cache().stats())
+
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unexpired token issued by create_access_token, else None."""
+    cache = _get_token_cache()
+    claims = cache.get(token)
+    if claims is not None:
+        return claims
+    if jwt is None:
+        return None
+    try:
+        claims = jwt.decode(token, os.getenv("SECRET_KEY", "dev-secret-key"), algorithms=[ALGORITHM])
+    except Exception:
+        return None
+    if not claims.get("sub") or "exp" not in claims:
+        return None
+    remaining = float(claims["exp"]) - time.time()
+    if remaining > 0:
+        cache.set(token, claims, ttl=min(cache.ttl, remaining))
+    return claims
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def optional_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[str]:
+    """Dependency: the caller's user id, or None for anonymous requests.
+    A token that is present but invalid or expired is still rejected.
+    """
+    if credentials is None:
+        return None
+    claims = decode_access_token(credentials.credentials)
+    if claims is None:
+        raise _unauthorized("Invalid or expired token")
+    return str(claims["sub"])
+
+
+def current_user_id(user_id: Optional[str] = Depends(optional_user_id)) -> str:
+    """Dependency: the caller's user id; 401 unless a valid bearer token is sent."""
+    if user_id is None:
+        raise _unauthorized("Not authenticated")
+    return user_id
+
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Authentication is busy, retry shortly", headers={"Retry-After": "1"})
+
+
+async def _store_call(fn, *args):
+    # Store calls block (SQLite queries, group-commit waits in the JSON store); keep them off the loop
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
 @router.post("/signup", response_model=AuthResponse)
-def signup(payload: SignupRequest) -> AuthResponse:
-    existing = get_user_by_email(payload.email)
+async def signup(payload: SignupRequest) -> AuthResponse:
+    existing = await _store_call(get_user_by_email, payload.email)
     if existing:
         raise HTTPException(status_code=409, detail="Email already registered")
+    try:
+        password_hash = await hash_password_async(payload.password)
+    except HashPoolBusy:
+        raise _busy()
     user = {
         "email": payload.email,
         "name": payload.name,
-        "password_hash": hash_password(payload.password),
+        "password_hash": password_hash,
     }
-    uid = save_user(user)
+    try:
+        uid = await _store_call(save_user, user)
+    except ValueError:
+        # Lost a race with a concurrent signup for the same email
+        raise HTTPException(status_code=409, detail="Email already registered")
     token = create_access_token({"sub": uid, "email": payload.email})
     return AuthResponse(access_token=token, user=UserOut(id=uid, email=payload.email, name=payload.name))
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(payload: LoginRequest) -> AuthResponse:
-    user = get_user_by_email(payload.email)
+async def login(payload: LoginRequest) -> AuthResponse:
+    user = await _store_call(get_user_by_email, payload.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(payload.password, user.get("password_hash", "")):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    stored = user.get("password_hash", "")
+    try:
+        if not await verify_password_async(payload.password, stored):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+    except HashPoolBusy:
+        raise _busy()
+    if needs_rehash(stored):
+        # BCRYPT_COST changed (or a legacy hash): upgrade while we hold the plaintext.
+        # The upgrade is best effort; a busy pool just leaves it for the next login.
+        try:
+            user = {**user, "password_hash": await hash_password_async(payload.password)}
+            await _store_call(save_user, user)
+        except HashPoolBusy:
+            pass
     uid = user.get("id")
     token = create_access_token({"sub": uid, "email": payload.email})
     return AuthResponse(access_token=token, user=UserOut(id=uid, email=payload.email, name=user.get("name")))
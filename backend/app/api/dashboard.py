@@ -1,38 +1,113 @@
 from __future__ import annotations
-from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, Query
-from ..utils.state import list_predictions
+from typing import Optional, List, Dict, Any, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from .auth import optional_user_id
+from ..utils.state import list_predictions, predictions_version
+import base64
+import hashlib
+import json
 import os
 
 router = APIRouter()
 
-@router.get("/dashboard")
-def get_dashboard(user_id: Optional[str] = Query(default=None)) -> Dict[str, Any]:
-    """Return summary of past screenings for a user (or all if user_id not provided).
-    Each item includes date, diseases with risk and recommendations, and a PDF link.
-    """
-    base_url = os.getenv("BASE_URL", "")
-    items: List[Dict[str, Any]] = []
-    for rec in list_predictions(user_id=user_id):
-        preds = rec.get("predictions", [])
+# Item keys that `fields` may select. "recommendations" and "explanation" are
+# per-disease detail; list views can leave them out to keep payloads small.
+_ITEM_FIELDS = {"prediction_id", "date", "diseases", "pdf_link", "recommendations", "explanation"}
+_DEFAULT_FIELDS = {"prediction_id", "date", "diseases", "pdf_link", "recommendations"}
+
+
+def _encode_cursor(rec: Dict[str, Any]) -> str:
+    raw = json.dumps([rec.get("created_at") or "", rec.get("id")]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, pid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), str(pid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _parse_fields(fields: Optional[str]) -> set:
+    if not fields:
+        return _DEFAULT_FIELDS
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - _ITEM_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(sorted(unknown))}")
+    return wanted
+
+
+def _summarize(rec: Dict[str, Any], wanted: set, base_url: str) -> Dict[str, Any]:
+    item: Dict[str, Any] = {}
+    if "prediction_id" in wanted:
+        item["prediction_id"] = rec.get("id")
+    if "date" in wanted:
+        item["date"] = rec.get("created_at")
+    if "diseases" in wanted:
         # build per-disease summary
         diseases = []
-        for p in preds:
-            prob = float(p.get("probability", 0.0))
-            diseases.append({
+        for p in rec.get("predictions", []):
+            d = {
                 "disease": p.get("disease"),
-                "probability": prob,
+                "probability": float(p.get("probability", 0.0)),
                 "risk_band": p.get("risk_band"),
-                "recommendations": p.get("recommendations") or [],
-            })
+            }
+            if "recommendations" in wanted:
+                d["recommendations"] = p.get("recommendations") or []
+            if "explanation" in wanted:
+                d["explanation"] = p.get("explanation")
+            diseases.append(d)
+        item["diseases"] = diseases
+    if "pdf_link" in wanted:
         # Prefer GET endpoint for opening reports directly
         pdf_link = f"/report/{rec.get('id')}"
         if base_url:
             pdf_link = base_url.rstrip('/') + pdf_link
-        items.append({
-            "prediction_id": rec.get("id"),
-            "date": rec.get("created_at"),
-            "diseases": diseases,
-            "pdf_link": pdf_link,
-        })
-    return {"items": items}
+        item["pdf_link"] = pdf_link
+    return item
+
+
+@router.get("/dashboard")
+def get_dashboard(
+    request: Request,
+    response: Response,
+    user_id: Optional[str] = Depends(optional_user_id),
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    before: Optional[str] = Query(default=None, description="next_cursor from a previous page"),
+    since: Optional[str] = Query(default=None, description="only screenings created after this ISO timestamp"),
+    fields: Optional[str] = Query(default=None, description="comma-separated item fields to include"),
+):
+    """Return summary of the authenticated user's past screenings. Without a bearer
+    token only screenings saved without an account are listed (never another user's).
+    Each item includes date, diseases with risk and recommendations, and a PDF link.
+
+    Pages newest first: pass `limit` and then `before=<next_cursor>` to continue.
+    Clients that already hold history can pass `since` (or If-None-Match with the
+    previous ETag, answered with 304 when nothing changed) to fetch only new screenings.
+    """
+    wanted = _parse_fields(fields)
+    base_url = os.getenv("BASE_URL", "")
+
+    anonymous = user_id is None
+    version = predictions_version(user_id, anonymous=anonymous)
+    tag_src = "|".join([version, str(user_id), str(limit), str(before), str(since), ",".join(sorted(wanted)), base_url])
+    etag = '"' + hashlib.sha1(tag_src.encode("utf-8")).hexdigest() + '"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cursor = _decode_cursor(before) if before else None
+    # Fetch one extra row to know whether another page exists
+    fetch = limit + 1 if limit is not None else None
+    recs = list_predictions(user_id=user_id, limit=fetch, before=cursor, since=since, anonymous=anonymous)
+    next_cursor = None
+    if limit is not None and len(recs) > limit:
+        recs = recs[:limit]
+        next_cursor = _encode_cursor(recs[-1])
+
+    items: List[Dict[str, Any]] = [_summarize(rec, wanted, base_url) for rec in recs]
+    response.headers["ETag"] = etag
+    return {"items": items, "next_cursor": next_cursor}
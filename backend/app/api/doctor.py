@@ -1,7 +1,9 @@
 from __future__ import annotations
 from typing import Optional, Dict, Any
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from .auth import optional_user_id
 from ..utils.state import save_consult
+from ..utils.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, run_idempotent
 from datetime import datetime
 
 router = APIRouter()
@@ -47,27 +49,37 @@ def list_doctors() -> Dict[str, Any]:
 
 @router.post("/consult")
 def schedule_consult(
-    user_id: Optional[str] = None,
+    response: Response,
+    user_id: Optional[str] = Depends(optional_user_id),
     doctor_id: Optional[str] = None,
     prediction_id: Optional[str] = None,
     mode: str = "teleconsult",  # or "send_report"
     when_iso: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(default=None, alias=IDEMPOTENCY_HEADER),
 ) -> Dict[str, Any]:
     """Mock scheduling of teleconsult or sending a report to a doctor. Saves to local log.
     In a real system, this would trigger notifications/integrations.
+    Resubmits carrying the same Idempotency-Key get the original consult back.
     """
     if not doctor_id or not mode:
         raise HTTPException(status_code=400, detail="doctor_id and mode are required")
     if mode not in ("teleconsult", "send_report"):
         raise HTTPException(status_code=400, detail="invalid mode")
 
-    record = {
-        "user_id": user_id,
-        "doctor_id": doctor_id,
-        "prediction_id": prediction_id,
-        "mode": mode,
-        "when": when_iso or datetime.utcnow().isoformat(),
-        "status": "scheduled" if mode == "teleconsult" else "sent",
-    }
-    cid = save_consult(record)
-    return {"consult_id": cid, "status": record["status"], "disclaimer": DISCLAIMER}
+    def run() -> Dict[str, Any]:
+        record = {
+            "user_id": user_id,
+            "doctor_id": doctor_id,
+            "prediction_id": prediction_id,
+            "mode": mode,
+            "when": when_iso or datetime.utcnow().isoformat(),
+            "status": "scheduled" if mode == "teleconsult" else "sent",
+        }
+        cid = save_consult(record)
+        return {"consult_id": cid, "status": record["status"], "disclaimer": DISCLAIMER}
+
+    params = {"doctor_id": doctor_id, "prediction_id": prediction_id, "mode": mode, "when_iso": when_iso}
+    result, replayed = run_idempotent(f"consult:{user_id}", idempotency_key, params, run)
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
@@ -1,19 +1,24 @@
 from __future__ import annotations
-from typing import List
-from fastapi import APIRouter, Query
-from ..schemas.intake import HealthIntake
-from ..schemas.prediction import PredictionItem, PredictionResponse
-from ..gemini.gemini_client import get_doctor_explanation
-from ..utils.state import save_prediction
-from ..utils.model_loader import get_model
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, Response
+from .auth import optional_user_id
+from ..schemas.intake import HealthIntake, HealthIntakeBatch
+from ..schemas.prediction import PredictionItem, PredictionResponse, BatchPredictionResponse
+from ..gemini.admission import llm_status
+from ..gemini.gemini_client import get_doctor_explanations_with_sources_async
+from ..utils.state import save_prediction, save_predictions
+from ..utils.model_loader import get_explainer, get_model, model_version
+from ..reports.jobs import enqueue_report
+from ..utils.cache import TTLCache
+from ..utils.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, run_idempotent_async
+from ..utils.metrics import register_cache, timed
+import asyncio
+import hashlib
+import json
 import numpy as np
 import os
-
-# Optional SHAP; guarded import
-try:  # pragma: no cover
-    import shap  # type: ignore
-except Exception:  # pragma: no cover
-    shap = None
+import threading
 
 router = APIRouter()
 
@@ -27,16 +32,54 @@ def _band_from_prob(p: float) -> str:
     return "low"
 
 
-def _build_feature_vector(x: HealthIntake):
+FEATURE_NAMES = [
+    "age",
+    "sex_male",
+    "sex_female",
+    "sex_other",
+    "height",
+    "weight",
+    "systolic",
+    "diastolic",
+    "glucose",
+    "symptom_count",
+]
+
+DISEASES = ["diabetes", "heart", "kidney"]
+
+DISEASE_LABELS = {
+    "diabetes": "Diabetes",
+    "heart": "Heart",
+    "kidney": "Kidney",
+}
+
+RECOMMENDATIONS = {
+    "diabetes": [
+        "Monitor fasting glucose and consider HbA1c test.",
+        "Adopt a balanced diet low in refined sugars.",
+        "Increase physical activity to 150 min/week.",
+    ],
+    "heart": [
+        "Track blood pressure at home for 1–2 weeks.",
+        "Limit sodium intake and manage stress.",
+        "Consult a clinician if BP remains elevated.",
+    ],
+    "kidney": [
+        "Discuss kidney function tests (e.g., eGFR, UACR).",
+        "Hydrate adequately; avoid unnecessary NSAIDs.",
+        "Blood pressure control is key to kidney health.",
+    ],
+}
+
+
+def _feature_row(x: HealthIntake) -> List[float]:
     # Basic engineered features based on intake fields
-    sex_vals = [
-        1.0 if (x.sex or "").lower() == "male" else 0.0,
-        1.0 if (x.sex or "").lower() == "female" else 0.0,
-        1.0 if (x.sex or "").lower() == "other" else 0.0,
-    ]
-    feats = [
+    sex = (x.sex or "").lower()
+    return [
         float(x.age or 0),
-        *sex_vals,
+        1.0 if sex == "male" else 0.0,
+        1.0 if sex == "female" else 0.0,
+        1.0 if sex == "other" else 0.0,
         float(x.height or 0),
         float(x.weight or 0),
         float(x.systolic or 0),
@@ -44,91 +87,58 @@ def _build_feature_vector(x: HealthIntake):
         float(x.glucose or 0),
         float(len(x.symptoms or [])),
     ]
-    names = [
-        "age",
-        "sex_male",
-        "sex_female",
-        "sex_other",
-        "height",
-        "weight",
-        "systolic",
-        "diastolic",
-        "glucose",
-        "symptom_count",
-    ]
-    return np.array(feats, dtype=float).reshape(1, -1), names
 
 
-def _heuristic_probabilities(x: HealthIntake):
-    age = float(x.age or 0)
-    sys = float(x.systolic or 0)
-    dia = float(x.diastolic or 0)
-    glu = float(x.glucose or 0)
+def _build_feature_matrix(intakes: List[HealthIntake]):
+    """Stack intakes into one N×F matrix (rows follow FEATURE_NAMES)."""
+    rows = [_feature_row(x) for x in intakes]
+    return np.array(rows, dtype=float).reshape(len(rows), len(FEATURE_NAMES)), list(FEATURE_NAMES)
+
 
-    clamp01 = lambda v: max(0.0, min(1.0, v))
-    diabetes = clamp01((glu - 90) / 120)
-    heart = clamp01(((sys - 110) / 70) * 0.7 + ((dia - 70) / 40) * 0.3)
-    kidney = clamp01(((age - 40) / 40) * 0.4 + ((dia - 70) / 50) * 0.6)
+def _heuristic_probabilities_matrix(x_np) -> Dict[str, "np.ndarray"]:
+    """Vectorized heuristic risk over an N×F feature matrix."""
+    age = x_np[:, FEATURE_NAMES.index("age")]
+    sys = x_np[:, FEATURE_NAMES.index("systolic")]
+    dia = x_np[:, FEATURE_NAMES.index("diastolic")]
+    glu = x_np[:, FEATURE_NAMES.index("glucose")]
 
     return {
-        "diabetes": float(diabetes),
-        "heart": float(heart),
-        "kidney": float(kidney),
+        "diabetes": np.clip((glu - 90) / 120, 0.0, 1.0),
+        "heart": np.clip(((sys - 110) / 70) * 0.7 + ((dia - 70) / 40) * 0.3, 0.0, 1.0),
+        "kidney": np.clip(((age - 40) / 40) * 0.4 + ((dia - 70) / 50) * 0.6, 0.0, 1.0),
     }
 
 
-def _shap_top_features(model, x_np, feature_names: List[str], top_k: int = 5) -> List[str]:
-    if shap is None or model is None:
-        return []
-    try:
-        explainer = shap.Explainer(model)
-        sv = explainer(x_np)
-        vals = np.abs(sv.values[0]) if hasattr(sv, "values") else np.abs(sv[0].values)
-        idx = np.argsort(vals)[::-1][:top_k]
-        return [feature_names[i] for i in idx]
-    except Exception:
-        return []
+def _model_probabilities(models: Dict[str, object], x_np) -> Dict[str, "np.ndarray"]:
+    """Score all rows of x_np with one call per model; falls back to heuristics if any model is missing."""
+    if any(m is None for m in models.values()):
+        return _heuristic_probabilities_matrix(x_np)
+    n = x_np.shape[0]
+    probs: Dict[str, np.ndarray] = {}
+    for name, mdl in models.items():
+        try:
+            # Try scikit-like predict_proba; otherwise decision_function scaled
+            if hasattr(mdl, "predict_proba"):
+                p = np.asarray(mdl.predict_proba(x_np)[:, 1], dtype=float)
+            elif hasattr(mdl, "predict"):
+                # naive scaling of decision score
+                score = np.asarray(mdl.predict(x_np), dtype=float).reshape(n)
+                p = 1.0 / (1.0 + np.exp(-score))
+            else:
+                p = np.zeros(n)
+            probs[name] = np.clip(p, 0.0, 1.0)
+        except Exception:
+            probs[name] = np.zeros(n)
+    return probs
 
 
-@router.post("/predict", response_model=PredictionResponse)
-def predict(intake: HealthIntake, user_id: str | None = Query(default=None)) -> PredictionResponse:
+def _load_models() -> Dict[str, object]:
     model_dir = os.getenv("MODEL_DIR", "./app/models")
-
-    x_np, feature_names = _build_feature_vector(intake)
-
     # Attempt to load models; fall back to heuristics if unavailable
-    models = {
-        "diabetes": get_model(model_dir, "diabetes"),
-        "heart": get_model(model_dir, "heart"),
-        "kidney": get_model(model_dir, "kidney"),
-    }
+    return {key: get_model(model_dir, key) for key in DISEASES}
 
-    if any(m is None for m in models.values()):
-        probs = _heuristic_probabilities(intake)
-    else:
-        probs = {}
-        for name, mdl in models.items():
-            try:
-                # Try scikit-like predict_proba; otherwise decision_function scaled
-                if hasattr(mdl, "predict_proba"):
-                    p = float(mdl.predict_proba(x_np)[0, 1])
-                elif hasattr(mdl, "predict"):
-                    # naive scaling of decision score
-                    score = float(mdl.predict(x_np)[0])
-                    p = 1.0 / (1.0 + np.exp(-score))
-                else:
-                    p = 0.0
-                probs[name] = max(0.0, min(1.0, p))
-            except Exception:
-                probs[name] = 0.0
-
-    results: List[PredictionItem] = []
-    disease_labels = {
-        "diabetes": "Diabetes",
-        "heart": "Heart",
-        "kidney": "Kidney",
-    }
 
+def _user_context(intake: HealthIntake) -> str:
     # Build a compact user context string from intake
     user_ctx_parts: List[str] = []
     if intake.symptoms:
@@ -137,46 +147,49 @@ def predict(intake: HealthIntake, user_id: str | None = Query(default=None)) ->
         user_ctx_parts.append(f"Past: {intake.pastDiseases}")
     if intake.medications:
         user_ctx_parts.append(f"Meds: {intake.medications}")
-    user_ctx = "; ".join(user_ctx_parts)
-
-    for key in ["diabetes", "heart", "kidney"]:
-        prob = float(probs.get(key, 0.0))
-        band = _band_from_prob(prob)
-        top_feats = _shap_top_features(models.get(key), x_np, feature_names)
-        # Fetch a patient-friendly explanation (Gemini-backed or mock)
-        explanation = get_doctor_explanation(disease_labels[key], prob, top_feats, user_ctx)
-
-        recs: List[str] = []
-        if key == "diabetes":
-            recs = [
-                "Monitor fasting glucose and consider HbA1c test.",
-                "Adopt a balanced diet low in refined sugars.",
-                "Increase physical activity to 150 min/week.",
-            ]
-        elif key == "heart":
-            recs = [
-                "Track blood pressure at home for 1–2 weeks.",
-                "Limit sodium intake and manage stress.",
-                "Consult a clinician if BP remains elevated.",
-            ]
-        elif key == "kidney":
-            recs = [
-                "Discuss kidney function tests (e.g., eGFR, UACR).",
-                "Hydrate adequately; avoid unnecessary NSAIDs.",
-                "Blood pressure control is key to kidney health.",
-            ]
+    return "; ".join(user_ctx_parts)
+
 
-        results.append(
+def _pending_rows(
+    intakes: List[HealthIntake],
+    probs: Dict[str, "np.ndarray"],
+    models: Dict[str, object],
+    x_np,
+    feature_names: List[str],
+) -> List[Tuple[int, str, float, List[str], str]]:
+    """(row, disease key, probability, top SHAP features, user context) for every row × disease."""
+    with timed("shap"):
+        top = {key: _shap_top_features_batch(key, models.get(key), x_np, feature_names) for key in DISEASES}
+    pending = []
+    for i, intake in enumerate(intakes):
+        user_ctx = _user_context(intake)
+        for key in DISEASES:
+            prob = float(probs[key][i])
+            pending.append((i, key, prob, top[key][i], user_ctx))
+    return pending
+
+
+def _explain_items(pending) -> List[Tuple[str, float, List[str], str]]:
+    return [(DISEASE_LABELS[key], prob, feats, ctx) for _, key, prob, feats, ctx in pending]
+
+
+def _build_items(n: int, pending, explanations: List[str]) -> List[List[PredictionItem]]:
+    results: List[List[PredictionItem]] = [[] for _ in range(n)]
+    for (i, key, prob, top_feats, _), explanation in zip(pending, explanations):
+        results[i].append(
             PredictionItem(
-                disease=disease_labels[key],
+                disease=DISEASE_LABELS[key],
                 probability=prob,
-                risk_band=band,
+                risk_band=_band_from_prob(prob),
                 top_features=top_feats,
-                recommendations=recs,
+                recommendations=list(RECOMMENDATIONS[key]),
                 explanation=explanation,
             )
         )
+    return results
 
+
+def _record(intake: HealthIntake, results: List[PredictionItem], user_id: Optional[str]) -> Dict[str, Any]:
     # Save prediction record for report generation
     record = {
         "intake": intake.model_dump() if hasattr(intake, 'model_dump') else intake.dict(),
@@ -184,10 +197,220 @@ def predict(intake: HealthIntake, user_id: str | None = Query(default=None)) ->
     }
     if user_id:
         record["user_id"] = user_id
-    pid = save_prediction(record)
+    return record
+
+
+def _shap_top_features_batch(name: str, model, x_np, feature_names: List[str], top_k: int = 5) -> List[List[str]]:
+    """Top-k SHAP features for every row of x_np, from one explainer call on the whole matrix."""
+    n = x_np.shape[0]
+    explainer = get_explainer(name, model)
+    if explainer is None:
+        return [[] for _ in range(n)]
+    try:
+        sv = explainer(x_np)
+        vals = np.asarray(sv.values if hasattr(sv, "values") else sv)
+        if vals.ndim == 3:
+            # Per-class attributions (n, features, classes): explain the positive class
+            vals = vals[:, :, -1]
+        idx = np.argsort(np.abs(vals.reshape(n, -1)), axis=1)[:, ::-1][:, :top_k]
+        return [[feature_names[i] for i in row] for row in idx]
+    except Exception:
+        return [[] for _ in range(n)]
+
+
+# Optional result cache for repeated intakes (PREDICT_CACHE_SIZE > 0 enables it)
+_result_cache: Optional[TTLCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def _get_result_cache() -> TTLCache:
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = TTLCache(
+                    max_entries=int(os.getenv("PREDICT_CACHE_SIZE", "0")),
+                    ttl=float(os.getenv("PREDICT_CACHE_TTL_S", "600")),
+                )
+    return _result_cache
+
+
+register_cache("predict", lambda: _get_result_cache().stats())
+
+
+def _model_versions(models: Dict[str, object]) -> Optional[Dict[str, Optional[str]]]:
+    """Artifact version of each loaded model (None for the heuristic fallback), or
+    None if a hot reload swapped a model out mid-request and results must not be cached.
+    """
+    versions: Dict[str, Optional[str]] = {}
+    for key, model in models.items():
+        if model is None:
+            versions[key] = None
+            continue
+        version = model_version(key, model)
+        if version is None:
+            return None
+        versions[key] = version
+    return versions
+
+
+def _intake_key(intake: HealthIntake, x_row, versions: Dict[str, Optional[str]]) -> str:
+    """Canonical hash of everything that shapes the result: the model features,
+    the context passed to Gemini, and the artifact version of each model (so a
+    hot reload invalidates old entries). Flags like labsUploaded are ignored.
+    """
+    canon = {
+        "features": [float(v) for v in x_row],
+        "context": _user_context(intake),
+        "models": versions,
+    }
+    return hashlib.sha256(json.dumps(canon, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Inference and SHAP are CPU-bound; they run on this pool so the event loop only
+# ever waits on them (and on Gemini) instead of doing the work itself
+_cpu_pool: Optional[ThreadPoolExecutor] = None
+_cpu_pool_lock = threading.Lock()
+
+
+def _get_cpu_pool() -> ThreadPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        with _cpu_pool_lock:
+            if _cpu_pool is None:
+                workers = int(os.getenv("PREDICT_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+                _cpu_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="predict-cpu")
+    return _cpu_pool
 
-    return PredictionResponse(prediction_id=pid, predictions=results)
 
+def _prepare(intakes: List[HealthIntake]):
+    """CPU part of scoring: features, result-cache lookup, then inference and SHAP
+    for the rows that missed. Returns (results, keys, misses, pending); results
+    holds None for every row still waiting on explanations.
+    """
+    with timed("features"):
+        x_np, feature_names = _build_feature_matrix(intakes)
+    models = _load_models()
+    cache = _get_result_cache()
+    versions = _model_versions(models) if cache.enabled else None
+    keys = [_intake_key(x, x_np[i], versions) for i, x in enumerate(intakes)] if versions is not None else []
+    results: List[Optional[List[PredictionItem]]] = [None] * len(intakes)
+    misses: List[int] = []
+    for i in range(len(intakes)):
+        hit = cache.get(keys[i]) if keys else None
+        if hit is not None:
+            results[i] = [PredictionItem(**item) for item in hit]
+        else:
+            misses.append(i)
+    pending = []
+    if misses:
+        sub = x_np[misses]
+        with timed("inference"):
+            probs = _model_probabilities(models, sub)
+        pending = _pending_rows([intakes[i] for i in misses], probs, models, sub, feature_names)
+    return results, keys, misses, pending
+
+
+async def _score(intakes: List[HealthIntake]) -> Tuple[List[List[PredictionItem]], List[bool]]:
+    """Score every intake, serving repeats from the result cache and running
+    inference, SHAP and Gemini only for the rows that miss. Also returns, per
+    intake, whether any of its explanations is the mock text.
+    """
+    loop = asyncio.get_running_loop()
+    results, keys, misses, pending = await loop.run_in_executor(_get_cpu_pool(), _prepare, intakes)
+    mocked = [False] * len(intakes)
+    if misses:
+        explanations, sources = await get_doctor_explanations_with_sources_async(_explain_items(pending))
+        scored = _build_items(len(misses), pending, explanations)
+        # A row carrying any mock explanation (deadline, refusal, breaker open) is
+        # served but not cached, so it gets the real text once Gemini recovers.
+        # Without an API key the mock text is the final answer and is cached too.
+        cacheable = ("gemini", "fallback") if llm_status() == "disabled" else ("gemini",)
+        complete = [True] * len(misses)
+        for (row, *_), source in zip(pending, sources):
+            if source not in cacheable:
+                complete[row] = False
+        cache = _get_result_cache()
+        for (row, *_), source in zip(pending, sources):
+            if source != "gemini":
+                mocked[misses[row]] = True
+        for row, (i, res) in enumerate(zip(misses, scored)):
+            results[i] = res
+            if keys and complete[row]:
+                cache.set(keys[i], [r.model_dump() for r in res])
+    return results, mocked  # type: ignore[return-value]
+
+
+def _response_status(mocked: bool) -> str:
+    """llm_status for one response: the controller state, except that a response
+    holding a mock explanation while the controller reports "ok" (a deadline hit,
+    a shed call) is "degraded" rather than claiming real explanations.
+    """
+    status = llm_status()
+    return "degraded" if mocked and status == "ok" else status
+
+
+def _store(records: List[Dict[str, Any]]) -> List[str]:
+    with timed("persist"):
+        pids = save_predictions(records) if len(records) > 1 else [save_prediction(records[0])]
+    # Pre-render the PDFs so the first GET /report/{id} is usually a cache hit
+    for record in records:
+        if not enqueue_report(record):
+            break
+    return pids
+
+
+@router.post("/predict", response_model=PredictionResponse)
+async def predict(
+    intake: HealthIntake,
+    response: Response,
+    user_id: str | None = Depends(optional_user_id),
+    idempotency_key: str | None = Header(default=None, alias=IDEMPOTENCY_HEADER),
+) -> PredictionResponse:
+    async def run() -> PredictionResponse:
+        per_item, mocked = await _score([intake])
+        results = per_item[0]
+        # A cache hit still gets its own stored record
+        record = _record(intake, results, user_id)
+        pid = (await asyncio.get_running_loop().run_in_executor(None, _store, [record]))[0]
+        return PredictionResponse(prediction_id=pid, predictions=results, llm_status=_response_status(mocked[0]))
+
+    # Retries with the same Idempotency-Key share one computation and one stored record
+    result, replayed = await run_idempotent_async(f"predict:{user_id}", idempotency_key, intake.model_dump(), run)
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(
+    batch: HealthIntakeBatch,
+    response: Response,
+    user_id: str | None = Depends(optional_user_id),
+    idempotency_key: str | None = Header(default=None, alias=IDEMPOTENCY_HEADER),
+) -> BatchPredictionResponse:
+    """Score many intakes at once: one N×F matrix, one predict_proba call per model,
+    and a single bulk write to the store. Results follow the order of `items`.
+    """
+    intakes = batch.items
+    if not intakes:
+        return BatchPredictionResponse(results=[])
+
+    async def run() -> BatchPredictionResponse:
+        per_item, mocked = await _score(intakes)
+        records = [_record(x, res, user_id) for x, res in zip(intakes, per_item)]
+        pids = await asyncio.get_running_loop().run_in_executor(None, _store, records)
+        return BatchPredictionResponse(
+            results=[
+                PredictionResponse(prediction_id=pid, predictions=res, llm_status=_response_status(m))
+                for pid, res, m in zip(pids, per_item, mocked)
+            ]
+        )
+
+    result, replayed = await run_idempotent_async(f"predict_batch:{user_id}", idempotency_key, batch.model_dump(), run)
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
 
 """
 Sample payload for testing in Swagger UI (/docs) or curl:
@@ -1,48 +1,196 @@
 from __future__ import annotations
-from typing import Optional
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
-from ..utils.state import get_prediction
-from ..reports.pdf_generator import generate_pdf
-import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import io
+import shutil
+import zipfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from .auth import current_user_id
+from ..utils.state import get_prediction, list_predictions
+from ..reports.cache import report_etag
+from ..reports.jobs import ReportQueueFull, ensure_report, ensure_report_async, enqueue_report, job_status, queue_depth
 
 router = APIRouter()
 
-@router.post("/generate_report", response_class=Response)
-def generate_report(user_id: Optional[str] = None, prediction_id: str = ""):
-    """Generate a consultation PDF for a prior prediction and return it as application/pdf bytes.
-    Body params are accepted as form/query-like for simplicity; can be upgraded to a Pydantic model if needed.
-    """
+
+def _get_record(prediction_id: str) -> Dict[str, Any]:
     if not prediction_id:
         raise HTTPException(status_code=400, detail="prediction_id is required")
     rec = get_prediction(prediction_id)
     if not rec:
         raise HTTPException(status_code=404, detail="prediction not found")
+    return rec
+
 
-    # Generate PDF (and optionally save to REPORTS_DIR)
-    reports_dir = os.getenv("REPORTS_DIR", "./app/reports")
-    pdf_bytes = generate_pdf(rec, output_dir=reports_dir)
+def _record_and_etag(prediction_id: str) -> Tuple[Dict[str, Any], str]:
+    rec = _get_record(prediction_id)
+    return rec, report_etag(rec)
 
+
+async def _report_response(request: Request, prediction_id: str, disposition: str) -> Response:
+    # Store lookup (a blocking query with SQLite) and hashing the record stay off the event loop
+    rec, etag = await asyncio.get_running_loop().run_in_executor(None, _record_and_etag, prediction_id)
     headers = {
-        "Content-Disposition": f"attachment; filename=report_{prediction_id}.pdf"
+        "Content-Disposition": f"{disposition}; filename=report_{prediction_id}.pdf",
+        "ETag": etag,
+        "Cache-Control": "private, max-age=0, must-revalidate",
     }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # Serve the content-addressed cached PDF; rendered on the worker pool only if cold
+    try:
+        pdf_bytes, path = await ensure_report_async(rec)
+    except ReportQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail={"message": "Report queue is full, retry shortly", "status_url": f"/report/{prediction_id}/status"},
+            headers={"Retry-After": "2"},
+        )
+    if path is not None:
+        return FileResponse(path, media_type="application/pdf", headers=headers)
     return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 
+@router.post("/generate_report", response_class=Response)
+async def generate_report(request: Request, user_id: Optional[str] = None, prediction_id: str = ""):
+    """Generate a consultation PDF for a prior prediction and return it as application/pdf bytes.
+    Body params are accepted as form/query-like for simplicity; can be upgraded to a Pydantic model if needed.
+    """
+    return await _report_response(request, prediction_id, "attachment")
+
+
 @router.get("/report/{prediction_id}", response_class=Response)
-def get_report(prediction_id: str):
+async def get_report(request: Request, prediction_id: str):
     """Convenience GET endpoint to retrieve a report PDF by prediction id.
-    Useful for opening directly in a browser/webview.
+    Useful for opening directly in a browser/webview. Honors If-None-Match with 304.
     """
-    if not prediction_id:
-        raise HTTPException(status_code=400, detail="prediction_id is required")
-    rec = get_prediction(prediction_id)
-    if not rec:
-        raise HTTPException(status_code=404, detail="prediction not found")
+    return await _report_response(request, prediction_id, "inline")
 
-    reports_dir = os.getenv("REPORTS_DIR", "./app/reports")
-    pdf_bytes = generate_pdf(rec, output_dir=reports_dir)
-    headers = {
-        "Content-Disposition": f"inline; filename=report_{prediction_id}.pdf"
-    }
-    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+@router.get("/report/{prediction_id}/status")
+def get_report_status(prediction_id: str) -> Dict[str, Any]:
+    """Rendering status of a report: ready, queued, rendering or missing.
+    A missing report is queued for rendering (if the queue has room) before answering.
+    """
+    rec = _get_record(prediction_id)
+    status = job_status(rec)
+    if status == "missing" and enqueue_report(rec):
+        status = job_status(rec)
+    return {"prediction_id": prediction_id, "status": status, "queue_depth": queue_depth()}
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable sink for zipfile; drain() hands back whatever was written so far."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_records(user_id: str, since: Optional[str], until: Optional[str], page: int = 100) -> Iterator[Dict[str, Any]]:
+    # Walk the history page by page so only one page of records is held at a time
+    cursor = (until, chr(0x10FFFF)) if until else None
+    while True:
+        recs = list_predictions(user_id=user_id, limit=page, before=cursor, since=since)
+        yield from recs
+        if len(recs) < page:
+            return
+        cursor = (recs[-1].get("created_at") or "", recs[-1].get("id"))
+
+
+_Rendered = Tuple[Optional[bytes], Optional[str], Optional[Exception]]
+
+
+def _render_entry(rec: Dict[str, Any]) -> _Rendered:
+    # The archive is already streaming, so nothing may raise past this point:
+    # a full queue renders inline on the export thread and any other failure
+    # becomes a placeholder entry instead of truncating the download.
+    try:
+        pdf_bytes, path = ensure_report(rec, wait_for_slot=False)
+        return pdf_bytes, path, None
+    except Exception as exc:
+        return None, None, exc
+
+
+def _rendered(records: Iterator[Dict[str, Any]], parallel: int) -> Iterator[Tuple[Dict[str, Any], _Rendered]]:
+    """Yield (record, (bytes, path, error)) in order, keeping at most `parallel` renders in flight."""
+    if parallel <= 1:
+        for rec in records:
+            yield rec, _render_entry(rec)
+        return
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="export") as pool:
+        window: Deque[Tuple[Dict[str, Any], Any]] = deque()
+        for rec in records:
+            window.append((rec, pool.submit(_render_entry, rec)))
+            if len(window) >= parallel:
+                head, fut = window.popleft()
+                yield head, fut.result()
+        while window:
+            head, fut = window.popleft()
+            yield head, fut.result()
+
+
+def _zip_stream(user_id: str, since: Optional[str], until: Optional[str], parallel: int) -> Iterator[bytes]:
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for rec, (pdf_bytes, path, error) in _rendered(_iter_records(user_id, since, until), parallel):
+            date = (rec.get("created_at") or "")[:10] or "undated"
+            name = f"report_{date}_{rec.get('id')}"
+            src = None
+            if error is None and pdf_bytes is None:
+                try:
+                    # open before creating the entry so a vanished cache file can still become a placeholder
+                    src = open(path, 'rb')
+                except OSError as exc:
+                    error = exc
+            if error is not None:
+                zf.writestr(
+                    f"{name}.error.txt",
+                    f"The report for screening {rec.get('id')} could not be generated ({type(error).__name__}).\n"
+                    f"Download it again later from /report/{rec.get('id')}.\n",
+                )
+            else:
+                with zf.open(f"{name}.pdf", mode="w") as entry:
+                    if pdf_bytes is not None:
+                        entry.write(pdf_bytes)
+                    else:
+                        with src:
+                            shutil.copyfileobj(src, entry, 64 * 1024)
+            yield sink.drain()
+    yield sink.drain()
+
+
+@router.get("/reports/export")
+def export_reports(
+    user_id: str = Depends(current_user_id),
+    since: Optional[str] = Query(default=None, description="only screenings created after this ISO timestamp"),
+    until: Optional[str] = Query(default=None, description="only screenings created at or before this ISO timestamp"),
+    parallel: int = Query(default=1, ge=1, le=8, description="reports rendered concurrently"),
+) -> StreamingResponse:
+    """Download every report of the authenticated patient (optionally a date range) as one ZIP archive.
+    The archive is streamed entry by entry as each PDF becomes available, so memory
+    use does not grow with the number of reports. A report that cannot be rendered
+    is replaced by a short report_<date>_<id>.error.txt entry.
+    """
+    filename = f"reports_{user_id}.zip"
+    return StreamingResponse(
+        _zip_stream(user_id, since, until, parallel),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
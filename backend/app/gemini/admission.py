@@ -0,0 +1,222 @@
+from __future__ import annotations
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+import weakref
+from ..utils.metrics import Counter, Histogram, register_collector
+
+# Admission control for upstream LLM calls. At most GEMINI_MAX_CONCURRENCY calls
+# run at once; a call waits at most GEMINI_QUEUE_BUDGET_S for a slot, and is
+# turned away at once when GEMINI_MAX_QUEUE callers are already waiting. When
+# the p95 of recent upstream latencies exceeds GEMINI_LATENCY_SLO_S, every call
+# is refused for GEMINI_DEGRADE_COOLDOWN_S. A refused call makes the caller use
+# its mock text (fallback explanation / FALLBACK_REPLY) instead of piling up.
+#
+# status() is one of:
+#   ok        calls are admitted normally
+#   shedding  some calls were refused for queueing within the last few seconds
+#   degraded  latency SLO breached; all calls go to the fallback until cooldown ends
+#   open      the transport's circuit breaker is open
+#   disabled  Gemini is not configured (GEMINI_API_KEY unset)
+
+ADMISSIONS = Counter(
+    "caremate_llm_admission_total",
+    "LLM call admission decisions: admitted, queue_full, queue_timeout or degraded",
+    ("outcome",),
+)
+QUEUE_SECONDS = Histogram("caremate_llm_queue_seconds", "Time LLM calls waited for a concurrency slot")
+
+# How long a queue refusal keeps status() at "shedding"
+_SHED_WINDOW_S = 5.0
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_queue: int = 128,
+        queue_budget: float = 2.0,
+        latency_slo: float = 8.0,
+        cooldown: float = 30.0,
+        window: int = 50,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_budget = queue_budget
+        self.latency_slo = latency_slo
+        self.cooldown = cooldown
+        self._latencies: Deque[float] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+        # asyncio semaphores are bound to a loop; one per running loop
+        self._async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.waiting = 0
+        self._degraded_until = 0.0
+        self._last_shed = 0.0
+        self.reason: Optional[str] = None
+
+    # -- state -----------------------------------------------------------
+
+    def _p95(self) -> Optional[float]:
+        """Caller holds _lock."""
+        if len(self._latencies) < 10:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def degraded(self) -> bool:
+        with self._lock:
+            return time.monotonic() < self._degraded_until
+
+    def status(self) -> str:
+        from .transport import get_breaker
+
+        if not os.getenv("GEMINI_API_KEY"):
+            return "disabled"
+        now = time.monotonic()
+        with self._lock:
+            if now < self._degraded_until:
+                return "degraded"
+            shedding = now - self._last_shed < _SHED_WINDOW_S
+        if get_breaker().state == "open":
+            return "open"
+        return "shedding" if shedding else "ok"
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.status()
+        with self._lock:
+            p95 = self._p95()
+            return {
+                "status": state,
+                "reason": self.reason if state in ("degraded", "shedding") else None,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_concurrency": self.max_concurrency,
+                "p95_latency_s": round(p95, 3) if p95 is not None else None,
+                "latency_slo_s": self.latency_slo,
+            }
+
+    # -- bookkeeping -----------------------------------------------------
+
+    def _enter_queue(self) -> Optional[str]:
+        """Register a waiting caller, or return why it is refused outright."""
+        with self._lock:
+            if time.monotonic() < self._degraded_until:
+                refusal = "degraded"
+            elif self.waiting >= self.max_queue and self.in_flight >= self.max_concurrency:
+                refusal = "queue_full"
+                self._last_shed = time.monotonic()
+                self.reason = refusal
+            else:
+                self.waiting += 1
+                return None
+        ADMISSIONS.inc(refusal)
+        return refusal
+
+    def _leave_queue(self, admitted: bool, waited: float) -> None:
+        with self._lock:
+            self.waiting -= 1
+            if admitted:
+                self.in_flight += 1
+            else:
+                self._last_shed = time.monotonic()
+                self.reason = "queue_timeout"
+        QUEUE_SECONDS.observe(waited)
+        ADMISSIONS.inc("admitted" if admitted else "queue_timeout")
+
+    def _finish(self, elapsed: Optional[float]) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if elapsed is None:
+                return
+            self._latencies.append(elapsed)
+            p95 = self._p95()
+            if p95 is not None and p95 > self.latency_slo:
+                self._degraded_until = time.monotonic() + self.cooldown
+                self.reason = "latency_slo"
+                # Start the next period from fresh samples
+                self._latencies.clear()
+
+    # -- admission -------------------------------------------------------
+
+    @asynccontextmanager
+    async def admit_async(self, track_latency: bool = True) -> AsyncIterator[bool]:
+        """`async with admit_async() as ok:` — call upstream only if ok is True.
+        Streams pass track_latency=False: their duration is not a request latency.
+        """
+        if self._enter_queue() is not None:
+            yield False
+            return
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        start = time.monotonic()
+        acquire = asyncio.ensure_future(slots.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=max(0.0, self.queue_budget))
+        except BaseException:
+            _abandon(acquire, slots)
+            self._leave_queue(False, time.monotonic() - start)
+            raise
+        admitted = acquire in done
+        if not admitted:
+            _abandon(acquire, slots)
+        self._leave_queue(admitted, time.monotonic() - start)
+        if not admitted:
+            yield False
+            return
+        begun = time.monotonic()
+        try:
+            yield True
+        finally:
+            slots.release()
+            self._finish(time.monotonic() - begun if track_latency else None)
+
+
+def _abandon(acquire: "asyncio.Future", slots: asyncio.Semaphore) -> None:
+    """Cancel a pending acquire; if it got the slot before the cancel landed, give it back."""
+    acquire.cancel()
+    acquire.add_done_callback(lambda f: slots.release() if not f.cancelled() and f.exception() is None else None)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+                _controller = AdmissionController(
+                    max_concurrency=concurrency,
+                    max_queue=int(os.getenv("GEMINI_MAX_QUEUE", str(4 * concurrency))),
+                    queue_budget=float(os.getenv("GEMINI_QUEUE_BUDGET_S", "2")),
+                    latency_slo=float(os.getenv("GEMINI_LATENCY_SLO_S", "8")),
+                    cooldown=float(os.getenv("GEMINI_DEGRADE_COOLDOWN_S", "30")),
+                )
+    return _controller
+
+
+def llm_status() -> str:
+    return get_admission().status()
+
+
+register_collector(
+    "caremate_llm_in_flight",
+    "LLM calls currently running upstream",
+    "gauge",
+    lambda: [("caremate_llm_in_flight", {}, float(get_admission().in_flight))],
+)
+register_collector(
+    "caremate_llm_degraded",
+    "1 while LLM calls are refused because the latency SLO was breached",
+    "gauge",
+    lambda: [("caremate_llm_degraded", {}, float(get_admission().degraded()))],
+)
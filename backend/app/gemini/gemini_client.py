@@ -1,11 +1,15 @@
 from __future__ import annotations
+import hashlib
+import json
 import os
-from typing import List, Optional
-
-try:
-    import requests  # type: ignore
-except Exception:  # pragma: no cover
-    requests = None  # type: ignore
+import re
+import threading
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from ..utils.cache import TTLCache
+from ..utils.metrics import Counter, register_cache, register_collector, timed
+from .admission import get_admission
+from .transport import get_breaker, get_transport
 
 
 def _build_prompt(disease: str, probability: float, features: List[str], user_input: Optional[str]) -> str:
@@ -22,38 +26,197 @@ def _build_prompt(disease: str, probability: float, features: List[str], user_in
     )
 
 
-def _call_gemini_api(prompt: str) -> Optional[str]:
+def _build_combined_prompt(items: Sequence[Tuple[str, float, List[str]]], user_input: Optional[str]) -> str:
+    lines = []
+    for disease, probability, features in items:
+        pct = round(max(0.0, min(1.0, probability)) * 100)
+        feat_text = ", ".join(features[:5]) if features else "not specified"
+        lines.append(f"- {disease}: estimated risk {pct}%; top contributing factors: {feat_text}")
+    user_text = user_input or ""
+    return (
+        "You are a caring clinician. Write a brief, patient-friendly explanation of each AI risk result below.\n"
+        + "\n".join(lines) + "\n"
+        f"Patient context: {user_text}\n"
+        "For each, include: what this may mean, what to monitor, and 2–3 next steps. Keep each concise (80–120 words).\n"
+        "Reply with only a JSON object mapping each disease name exactly as written above to its explanation text."
+    )
+
+
+def _parse_combined(text: Optional[str], diseases: Sequence[str]) -> Dict[str, str]:
+    """Extract {disease: explanation} from a combined reply; tolerates code fences and key case."""
+    if not text:
+        return {}
+    m = re.search(r"\{.*\}", text, re.DOTALL)
+    if not m:
+        return {}
+    try:
+        data = json.loads(m.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    by_lower = {str(k).strip().lower(): v for k, v in data.items()}
+    out: Dict[str, str] = {}
+    for disease in diseases:
+        val = by_lower.get(disease.lower())
+        if isinstance(val, str) and val.strip():
+            out[disease] = val.strip()
+    return out
+
+
+# Response cache in front of the Gemini API. GEMINI_CACHE_SIZE=0 disables it;
+# GEMINI_CACHE_DIR adds an on-disk tier that survives restarts, capped at
+# GEMINI_CACHE_DISK_MAX files.
+_response_cache: Optional[TTLCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> TTLCache:
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                _response_cache = TTLCache(
+                    max_entries=int(os.getenv("GEMINI_CACHE_SIZE", "1024")),
+                    ttl=float(os.getenv("GEMINI_CACHE_TTL_S", "86400")),
+                    disk_dir=os.getenv("GEMINI_CACHE_DIR") or None,
+                    disk_max_entries=int(os.getenv("GEMINI_CACHE_DISK_MAX", "10000")),
+                )
+    return _response_cache
+
+
+def _cache_key(prompt: str, json_mode: bool) -> str:
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{int(json_mode)}:{normalized}".encode("utf-8")).hexdigest()
+
+
+def cache_stats() -> Dict[str, int]:
+    return _get_cache().stats()
+
+
+# Fallback rate = explanations{source!="gemini"} / explanations
+EXPLANATIONS = Counter(
+    "caremate_gemini_explanations_total",
+    "Explanations returned, by source: gemini, fallback (Gemini unavailable) or deadline (timed out)",
+    ("source",),
+)
+REQUESTS = Counter("caremate_gemini_requests_total", "Gemini API calls by outcome: ok, failed or refused (admission)", ("outcome",))
+register_cache("gemini", cache_stats)
+register_collector(
+    "caremate_gemini_breaker_open",
+    "1 while the Gemini circuit breaker rejects calls",
+    "gauge",
+    lambda: [("caremate_gemini_breaker_open", {}, float(get_breaker().state == "open"))],
+)
+
+
+def _model_path(method: str) -> str:
+    model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+    return f"v1beta/models/{model}:{method}"
+
+
+def _generate_payload(prompt: str, json_mode: bool) -> Dict:
+    # Google Generative Language API (Gemini) - simple text generation call
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if json_mode:
+        payload["generationConfig"] = {"responseMimeType": "application/json"}
+    return payload
+
+
+def _candidate_parts(data: Dict) -> List[str]:
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return []
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return [p.get("text", "") for p in parts if isinstance(p, dict)]
+
+
+def _reply_text(data: Optional[Dict]) -> Optional[str]:
+    REQUESTS.inc("ok" if data else "failed")
+    if not data:
+        return None
+    out = "\n".join([t for t in _candidate_parts(data) if t]).strip()
+    return out or None
+
+
+async def _request_gemini(prompt: str, json_mode: bool = False) -> Optional[str]:
     api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key or not requests:
+    if not api_key:
         return None
     try:
-        # Google Generative Language API (Gemini) - simple text generation call
-        endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        params = {"key": api_key}
-        resp = requests.post(endpoint, params=params, json=payload, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-        # Parse text response
-        candidates = data.get("candidates") or []
-        if candidates:
-            parts = candidates[0].get("content", {}).get("parts", [])
-            texts = [p.get("text", "") for p in parts if isinstance(p, dict)]
-            out = "\n".join([t for t in texts if t]).strip()
-            return out or None
+        async with get_admission().admit_async() as admitted:
+            if not admitted:
+                # Over the concurrency/queue budget or SLO-degraded: caller uses its fallback
+                REQUESTS.inc("refused")
+                return None
+            with timed("gemini_request"):
+                data = await get_transport().post_json(
+                    _model_path("generateContent"), _generate_payload(prompt, json_mode), params={"key": api_key}
+                )
+        return _reply_text(data)
+    except asyncio.CancelledError:
+        raise
     except Exception:
         return None
-    return None
 
 
-def get_doctor_explanation(disease: str, probability: float, features: List[str], user_input: Optional[str] = None) -> str:
-    """Return a patient-friendly explanation. If GEMINI_API_KEY is set and reachable, use Gemini; otherwise return a concise mock.
+async def call_gemini_api_async(prompt: str, json_mode: bool = False) -> Optional[str]:
+    """Cached Gemini text generation; only successful replies are cached.
+    HTTP calls go through the non-blocking transport: a request waiting on
+    Gemini costs a coroutine, not a thread.
     """
-    prompt = _build_prompt(disease, probability, features, user_input)
-    ai = _call_gemini_api(prompt)
-    if ai:
-        return ai
-    # Fallback mock
+    if not os.getenv("GEMINI_API_KEY"):
+        return None
+    cache = _get_cache()
+    key = _cache_key(prompt, json_mode)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    out = await _request_gemini(prompt, json_mode)
+    if out:
+        cache.set(key, out)
+    return out
+
+
+async def stream_gemini_api_async(prompt: str) -> AsyncIterator[str]:
+    """Yield reply text chunks from Gemini's streaming endpoint as they arrive.
+    Yields nothing if Gemini is not configured or unreachable; a cached reply is
+    yielded as a single chunk, and a stream that finished cleanly is added to the cache.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return
+    cache = _get_cache()
+    key = _cache_key(prompt, False)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    chunks: List[str] = []
+    finished = False
+    async with get_admission().admit_async(track_latency=False) as admitted:
+        if not admitted:
+            REQUESTS.inc("refused")
+            return
+        events = get_transport().stream_sse(
+            _model_path("streamGenerateContent"), _generate_payload(prompt, False), params={"key": api_key, "alt": "sse"}
+        )
+        async for event in events:
+            if not isinstance(event, dict):
+                continue
+            text = "".join(_candidate_parts(event))
+            if text:
+                chunks.append(text)
+                yield text
+            candidates = event.get("candidates") or [{}]
+            finished = finished or candidates[0].get("finishReason") == "STOP"
+    full = "".join(chunks).strip()
+    # Only cache replies the upstream marked complete, never a truncated stream
+    if full and finished:
+        cache.set(key, full)
+
+
+def _fallback_explanation(disease: str, probability: float, features: List[str]) -> str:
     pct = round(max(0.0, min(1.0, probability)) * 100)
     feat_text = ", ".join(features[:3]) if features else "various clinical factors"
     return (
@@ -61,3 +224,102 @@ def get_doctor_explanation(disease: str, probability: float, features: List[str]
         f"This estimate is influenced by {feat_text}. "
         "Consider tracking your readings, maintaining healthy habits, and discussing follow-up testing with a clinician if concerns persist."
     )
+
+
+async def get_doctor_explanation_async(disease: str, probability: float, features: List[str], user_input: Optional[str] = None) -> str:
+    """Return a patient-friendly explanation. If GEMINI_API_KEY is set and reachable, use Gemini; otherwise return a concise mock.
+    """
+    ai = await call_gemini_api_async(_build_prompt(disease, probability, features, user_input))
+    return ai or _fallback_explanation(disease, probability, features)
+
+
+async def get_combined_explanations_async(items: Sequence[Tuple[str, float, List[str]]], user_input: Optional[str] = None) -> List[str]:
+    """Explain several diseases for one patient with a single Gemini round trip.
+    Diseases missing from an unparseable reply are retried one by one; if Gemini is
+    unreachable altogether every item gets the mock explanation.
+    """
+    ai = await call_gemini_api_async(_build_combined_prompt(items, user_input), json_mode=True)
+    if not ai:
+        return [_fallback_explanation(d, p, f) for d, p, f in items]
+    parsed = _parse_combined(ai, [d for d, _, _ in items])
+    out = []
+    for d, p, f in items:
+        out.append(parsed.get(d) or await get_doctor_explanation_async(d, p, f, user_input))
+    return out
+
+
+def _explain_mode() -> str:
+    # "per_disease" (one call per disease, default) or "combined" (one call per patient)
+    return os.getenv("GEMINI_EXPLAIN_MODE", "per_disease").lower()
+
+
+async def _explain_single_async(item: Tuple[str, float, List[str], Optional[str]]) -> List[str]:
+    return [await get_doctor_explanation_async(*item)]
+
+
+def _group_items(items: Sequence[Tuple[str, float, List[str], Optional[str]]]) -> List[List[int]]:
+    """Split items into runs that share user_input and name each disease at most once."""
+    groups: List[List[int]] = []
+    for i, (disease, _, _, user_input) in enumerate(items):
+        cur = groups[-1] if groups else None
+        if cur is None or items[cur[0]][3] != user_input or any(items[j][0] == disease for j in cur):
+            groups.append([i])
+        else:
+            cur.append(i)
+    return groups
+
+
+def _finish_explanations(
+    items: Sequence[Tuple[str, float, List[str], Optional[str]]], out: List[Optional[str]]
+) -> Tuple[List[str], List[str]]:
+    """Fill items that got no reply with the mock explanation. Returns the texts
+    and, per item, its source: gemini, fallback or deadline (also counted in EXPLANATIONS).
+    """
+    result: List[str] = []
+    sources: List[str] = []
+    for i, text in enumerate(out):
+        fallback = _fallback_explanation(*items[i][:3])
+        if text is None:
+            source, text = "deadline", fallback
+        else:
+            source = "fallback" if text == fallback else "gemini"
+        EXPLANATIONS.inc(source)
+        result.append(text)
+        sources.append(source)
+    return result, sources
+
+
+async def get_doctor_explanations_with_sources_async(
+    items: Sequence[Tuple[str, float, List[str], Optional[str]]],
+    deadline: Optional[float] = None,
+) -> Tuple[List[str], List[str]]:
+    """Fetch explanations for several (disease, probability, features, user_input) items concurrently.
+    Waits at most `deadline` seconds overall (GEMINI_DEADLINE_S, default 20); calls still
+    pending by then are cancelled and get the mock explanation, so latency is bounded by
+    the slowest single call. With GEMINI_EXPLAIN_MODE=combined, consecutive items for the
+    same patient share one request. Returns the texts and the source of each (see
+    _finish_explanations).
+    """
+    if not items:
+        return [], []
+    if deadline is None:
+        deadline = float(os.getenv("GEMINI_DEADLINE_S", "20"))
+    with timed("explanations"):
+        if _explain_mode() == "combined":
+            groups = _group_items(items)
+            tasks = [
+                asyncio.ensure_future(get_combined_explanations_async([items[i][:3] for i in g], items[g[0]][3]))
+                for g in groups
+            ]
+        else:
+            groups = [[i] for i in range(len(items))]
+            tasks = [asyncio.ensure_future(_explain_single_async(items[i])) for i in range(len(items))]
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        out: List[Optional[str]] = [None] * len(items)
+        for task, g in zip(tasks, groups):
+            if task.done() and not task.cancelled() and task.exception() is None:
+                for i, text in zip(g, task.result()):
+                    out[i] = text
+        return _finish_explanations(items, out)
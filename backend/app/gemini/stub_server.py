@@ -0,0 +1,132 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Local stand-in for the Gemini generateContent / streamGenerateContent API.
+# Point the client at it with GEMINI_BASE_URL=http://127.0.0.1:<port> and any
+# GEMINI_API_KEY. Latency, chunking and failure rate are configurable so tests
+# and benchmarks can exercise slow or flaky upstreams.
+
+DEFAULT_REPLY = (
+    "Thanks for sharing. This is a stubbed response from the local Gemini stand-in. "
+    "Keep tracking your readings and talk to a clinician if anything worsens."
+)
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        chunk_delay: float = 0.0,
+        chunks: int = 8,
+        error_rate: float = 0.0,
+        reply: str = DEFAULT_REPLY,
+    ):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.reply = reply
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+
+def _response(text: str, finish: bool = True) -> dict:
+    cand = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish:
+        cand["finishReason"] = "STOP"
+    return {"candidates": [cand]}
+
+
+def _split(text: str, n: int):
+    step = max(1, -(-len(text) // n))
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def _make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - silence per-request logging
+            pass
+
+        def _send_json(self, status: int, body: dict) -> None:
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            cfg.count()
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            if cfg.latency:
+                time.sleep(cfg.latency)
+            if cfg.error_rate and random.random() < cfg.error_rate:
+                self._send_json(503, {"error": {"code": 503, "message": "stub unavailable"}})
+                return
+            if ":streamGenerateContent" in self.path:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = _split(cfg.reply, cfg.chunks)
+                for i, piece in enumerate(pieces):
+                    if i and cfg.chunk_delay:
+                        time.sleep(cfg.chunk_delay)
+                    event = f"data: {json.dumps(_response(piece, finish=i == len(pieces) - 1))}\r\n\r\n".encode("utf-8")
+                    self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            if ":generateContent" in self.path:
+                self._send_json(200, _response(cfg.reply))
+                return
+            self._send_json(404, {"error": {"code": 404, "message": "unknown method"}})
+
+    return Handler
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The socketserver default backlog of 5 drops connects under a burst of
+    # concurrent clients, which shows up as ~1s SYN-retry stalls in benchmarks
+    request_queue_size = 1024
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, config: Optional[StubConfig] = None):
+    """Start the stub on a daemon thread. Returns (server, config); server.server_port has the bound port."""
+    cfg = config or StubConfig()
+    server = _StubServer((host, port), _make_handler(cfg))
+    threading.Thread(target=server.serve_forever, name="gemini-stub", daemon=True).start()
+    return server, cfg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    cfg = StubConfig(args.latency, args.chunk_delay, args.chunks, args.error_rate)
+    srv = _StubServer((args.host, args.port), _make_handler(cfg))
+    print(f"Gemini stub listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+try:
+    import httpx  # type: ignore
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+# Status codes worth retrying: rate limiting and transient upstream errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and rejects calls for `cooldown`
+    seconds; afterwards a single trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The call was abandoned by the caller: free the half-open trial slot without a verdict."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """The process-wide breaker: every transport (one per event loop) shares one upstream health state."""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+                    cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN_S", "30")),
+                )
+    return _breaker
+
+
+# Connections per httpx client (see GeminiTransport)
+_SHARD_SIZE = 16
+
+
+class GeminiTransport:
+    """Pooled keep-alive httpx.AsyncClient for the Gemini API with split
+    connect/read timeouts, jittered exponential backoff on 429/5xx and a circuit
+    breaker. A waiting call holds no thread, so one worker can keep thousands of
+    requests in flight.
+
+    `base_url` defaults to GEMINI_BASE_URL so tests can point it at a local stub.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        pool_size: Optional[int] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = (base_url or os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")).rstrip("/")
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv("GEMINI_CONNECT_TIMEOUT_S", "3"))
+        self.read_timeout = read_timeout if read_timeout is not None else float(os.getenv("GEMINI_READ_TIMEOUT_S", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv("GEMINI_BACKOFF_BASE_S", "0.25"))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv("GEMINI_BACKOFF_MAX_S", "4"))
+        self.breaker = breaker or get_breaker()
+        size = max(1, pool_size if pool_size is not None else int(os.getenv("GEMINI_POOL_SIZE", "32")))
+        # httpcore scans every pooled connection (with a socket poll each) for
+        # every request it schedules, so one large pool gets slower the more
+        # connections it holds. Spread connections over small pools instead and
+        # cap in-flight calls here, so no request ever queues inside httpcore.
+        self._slots = asyncio.Semaphore(size)
+        self._clients: List[Any] = []
+        self._in_flight: List[int] = []
+        if httpx is not None:
+            for start in range(0, size, _SHARD_SIZE):
+                n = min(_SHARD_SIZE, size - start)
+                self._clients.append(httpx.AsyncClient(
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(max_connections=n, max_keepalive_connections=n),
+                ))
+                self._in_flight.append(0)
+        self.client = self._clients[0] if self._clients else None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @asynccontextmanager
+    async def _client(self):
+        """Hold a call slot and yield the least busy client (always below its connection limit)."""
+        async with self._slots:
+            i = min(range(len(self._clients)), key=self._in_flight.__getitem__)
+            self._in_flight[i] += 1
+            try:
+                yield self._clients[i]
+            finally:
+                self._in_flight[i] -= 1
+
+    async def post_json(self, path: str, payload: Dict[str, Any], params: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """POST JSON and return the decoded reply, or None when the call failed,
+        retries were exhausted or the circuit is open (callers use their fallback).
+        """
+        if self.client is None or not self.breaker.allow():
+            return None
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._client() as client:
+                    resp = await client.post(url, params=params, json=payload)
+                if resp.status_code not in RETRY_STATUSES:
+                    if resp.status_code >= 400:
+                        # Non-retryable 4xx: the upstream is healthy, the request is not
+                        self.breaker.record_success()
+                        return None
+                    data = resp.json()
+                    self.breaker.record_success()
+                    return data
+                retry_after = resp.headers.get("Retry-After")
+            except asyncio.CancelledError:
+                # Caller gave up (deadline); that says nothing about upstream health
+                self.breaker.release()
+                raise
+            except Exception:
+                pass
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        self.breaker.record_failure()
+        return None
+
+    async def stream_sse(self, path: str, payload: Dict[str, Any], params: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """POST and yield each decoded `data:` event of a Server-Sent Events reply.
+        No retries: a failed or rejected stream simply yields nothing (or stops early),
+        and the caller falls back to its degraded reply.
+        """
+        if self.client is None or not self.breaker.allow():
+            return
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        healthy = False
+        cancelled = False
+        try:
+            async with self._client() as client, client.stream("POST", url, params=params, json=payload) as resp:
+                if resp.status_code >= 400:
+                    healthy = resp.status_code not in RETRY_STATUSES
+                    return
+                async for line in resp.aiter_lines():
+                    if line and line.startswith("data:"):
+                        healthy = True
+                        yield json.loads(line[5:].strip())
+                healthy = True
+        except (GeneratorExit, asyncio.CancelledError):
+            # Consumer stopped reading (e.g. client disconnected); not an upstream fault
+            cancelled = True
+            raise
+        except Exception:
+            healthy = False
+        finally:
+            if cancelled:
+                self.breaker.release()
+            elif healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+
+# httpx connection pools belong to the event loop that created them, so keep one
+# transport per running loop (normally exactly one per process)
+_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, GeminiTransport]" = weakref.WeakKeyDictionary()
+
+
+def get_transport() -> GeminiTransport:
+    """The transport for the running event loop."""
+    loop = asyncio.get_running_loop()
+    transport = _transports.get(loop)
+    if transport is None:
+        transport = _transports[loop] = GeminiTransport()
+    return transport
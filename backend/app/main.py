@@ -1,11 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+import asyncio
 import os
 
 load_dotenv()
 
-app = FastAPI(title="CareMate Backend", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload and warm every model in MODEL_DIR so the first /predict after a deploy is fast
+    if os.getenv("MODEL_WARMUP", "1").lower() in ("1", "true", "yes"):
+        from .api.predict import FEATURE_NAMES
+        from .utils.model_loader import warmup
+        await asyncio.to_thread(warmup, os.getenv("MODEL_DIR", "./app/models"), len(FEATURE_NAMES))
+    yield
+
+
+app = FastAPI(title="CareMate Backend", version="0.1.0", lifespan=lifespan)
 
 # CORS (dev-friendly)
 origins = os.getenv("ALLOW_ORIGINS", "*").split(",")
@@ -25,7 +39,16 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    from .gemini.admission import get_admission
+    from .utils.model_loader import loaded_models
+    return {"status": "ok", "models": loaded_models(), "llm": get_admission().snapshot()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape endpoint (text exposition format 0.0.4)
+    from .utils.metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # Include API routers
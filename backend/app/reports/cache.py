@@ -0,0 +1,100 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+from .pdf_generator import TEMPLATE_VERSION, write_pdf
+from ..utils.cache import TTLCache
+from ..utils.metrics import register_cache
+
+# Content-addressed report cache. A prediction record never changes after it is
+# saved, so the rendered PDF is keyed by prediction id plus a digest of the
+# record and TEMPLATE_VERSION, and rendered at most once per key (see jobs.py).
+# Warm reports come from a small in-memory tier or are streamed from
+# REPORTS_DIR/cache.
+
+_memory: Optional[TTLCache] = None
+_memory_lock = threading.Lock()
+
+
+def _memory_cache() -> TTLCache:
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = TTLCache(
+                    max_entries=int(os.getenv("REPORT_MEMORY_CACHE_SIZE", "64")),
+                    ttl=float(os.getenv("REPORT_MEMORY_CACHE_TTL_S", "3600")),
+                )
+    return _memory
+
+
+def reports_dir() -> str:
+    return os.getenv("REPORTS_DIR", "./app/reports")
+
+
+def report_digest(record: Dict[str, Any]) -> str:
+    raw = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(TEMPLATE_VERSION.encode("utf-8") + b"\0" + raw).hexdigest()[:32]
+
+
+def report_etag(record: Dict[str, Any]) -> str:
+    return f'"{report_digest(record)}"'
+
+
+def cache_path(record: Dict[str, Any], base_dir: Optional[str] = None) -> str:
+    d = os.path.join(base_dir or reports_dir(), "cache")
+    return os.path.join(d, f"report_{record.get('id', 'unknown')}_{report_digest(record)}.pdf")
+
+
+def get_cached_report(record: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[str]]:
+    """Return (bytes, None) from memory, (None, path) from disk, or (None, None) when cold.
+    Small reports read from disk (<= REPORT_MEMORY_MAX_BYTES) are promoted to memory.
+    """
+    path = cache_path(record)
+    cache = _memory_cache()
+    data = cache.get(path)
+    if data is not None:
+        return data, None
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None, None
+    if cache.enabled and size <= int(os.getenv("REPORT_MEMORY_MAX_BYTES", str(512 * 1024))):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            cache.set(path, data)
+            return data, None
+        except OSError:
+            pass
+    return None, path
+
+
+def write_report_file(record: Dict[str, Any], base_dir: Optional[str] = None) -> str:
+    """Render `record` straight into its cache file under base_dir (temp file + rename)
+    and return the path; the PDF is never held in memory as one bytes object.
+    Runs inside report worker processes, so it only touches the disk tier.
+    """
+    path = cache_path(record, base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            write_pdf(record, f)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def cache_stats() -> Dict[str, int]:
+    return _memory_cache().stats()
+
+
+register_cache("report", cache_stats)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from .cache import cache_path, get_cached_report, reports_dir, write_report_file
+from ..utils.metrics import STAGE_SECONDS, timed
+
+# Background report rendering. PDF rendering is CPU-bound, so jobs run on a
+# bounded process pool (REPORT_WORKERS, default 2; 0 renders on one background
+# thread instead). /predict pre-warms reports through enqueue_report(), which
+# refuses new work once REPORT_QUEUE_MAX jobs are pending so a burst cannot pile
+# up unbounded renders. Requests for a cold report go through ensure_report(),
+# which joins an in-flight job instead of rendering the same PDF twice; the
+# same cap applies there, so ensure_report_async() raises ReportQueueFull when
+# the queue is full and ensure_report() (used by the export) waits for a slot.
+
+_pool: Optional[Any] = None
+_pool_lock = threading.Lock()
+# cache path -> pending job. Re-entrant: a job that finishes before
+# add_done_callback() runs its callback in the submitting thread, under the lock.
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.RLock()
+# Signalled whenever a job leaves _pending
+_slots = threading.Condition(_pending_lock)
+
+
+class ReportQueueFull(Exception):
+    """REPORT_QUEUE_MAX renders are already pending."""
+
+
+def _workers() -> int:
+    return max(0, int(os.getenv("REPORT_WORKERS", "2")))
+
+
+def _queue_max() -> int:
+    return max(1, int(os.getenv("REPORT_QUEUE_MAX", "32")))
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                n = _workers()
+                if n == 0:
+                    _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+                else:
+                    # spawn: forking a process that already runs threads is unsafe
+                    _pool = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_shutdown)
+
+
+def _submit(record: Dict[str, Any], path: str) -> Future:
+    """Submit a render for `record` unless one is already pending. Caller holds _pending_lock."""
+    fut = _pending.get(path)
+    if fut is not None:
+        return fut
+    submitted = time.perf_counter()
+    fut = _get_pool().submit(write_report_file, record, reports_dir())
+
+    def _done(f: Future, key: str = path) -> None:
+        # Timed here rather than inside the render: worker processes have their own
+        # metrics registry. Covers submit to done, i.e. queue wait plus render.
+        if not f.cancelled() and f.exception() is None:
+            STAGE_SECONDS.observe(time.perf_counter() - submitted, "pdf_render")
+        with _slots:
+            _pending.pop(key, None)
+            _slots.notify_all()
+
+    _pending[path] = fut
+    fut.add_done_callback(_done)
+    return fut
+
+
+def _claim(record: Dict[str, Any], path: str, wait: float = 0.0) -> Future:
+    """Join the pending render for `path` or submit one if the queue has room,
+    waiting up to `wait` seconds for a slot. Raises ReportQueueFull otherwise.
+    """
+    deadline = time.monotonic() + wait
+    with _slots:
+        while path not in _pending and len(_pending) >= _queue_max():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ReportQueueFull()
+            _slots.wait(remaining)
+        return _submit(record, path)
+
+
+@timed("pdf_render")
+def _render_inline(record: Dict[str, Any]) -> str:
+    return write_report_file(record, reports_dir())
+
+
+def enqueue_report(record: Dict[str, Any]) -> bool:
+    """Pre-render a report in the background. Returns False if it was already
+    cached or the queue is full (the report will then be rendered on first request).
+    """
+    if os.getenv("REPORT_PREWARM", "1").lower() not in ("1", "true", "yes"):
+        return False
+    data, cached = get_cached_report(record)
+    if data is not None or cached is not None:
+        return False
+    try:
+        _claim(record, cache_path(record))
+    except Exception:
+        return False
+    return True
+
+
+def ensure_report(record: Dict[str, Any], wait_for_slot: bool = True) -> Tuple[Optional[bytes], Optional[str]]:
+    """Return (bytes, None) or (None, path) for `record`, rendering it on the pool if cold.
+    Cold reports come back as a path so the response can stream the file.
+    Waits at most REPORT_RENDER_TIMEOUT_S for a queue slot (ReportQueueFull after
+    that) and as long again for the worker, then renders inline as a last resort.
+    With wait_for_slot=False a full queue is not waited on: the report is rendered
+    inline in the calling thread instead.
+    """
+    data, path = get_cached_report(record)
+    if data is not None or path is not None:
+        return data, path
+    timeout = float(os.getenv("REPORT_RENDER_TIMEOUT_S", "30"))
+    try:
+        fut = _claim(record, cache_path(record), wait=timeout if wait_for_slot else 0.0)
+    except ReportQueueFull:
+        if wait_for_slot:
+            raise
+        return None, _render_inline(record)
+    try:
+        path = fut.result(timeout=timeout)
+        if path and os.path.exists(path):
+            return None, path
+    except Exception:
+        pass
+    return None, _render_inline(record)
+
+
+async def ensure_report_async(record: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[str]]:
+    """ensure_report() for async routes: waits on the render job without holding a thread.
+    Raises ReportQueueFull at once when a new render would exceed REPORT_QUEUE_MAX.
+    """
+    loop = asyncio.get_running_loop()
+    data, path = await loop.run_in_executor(None, get_cached_report, record)
+    if data is not None or path is not None:
+        return data, path
+    fut = _claim(record, cache_path(record))
+    try:
+        # shield: timing out here must not cancel a job other requests may be waiting on
+        path = await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(fut)), timeout=float(os.getenv("REPORT_RENDER_TIMEOUT_S", "30"))
+        )
+        if path and os.path.exists(path):
+            return None, path
+    except Exception:
+        pass
+    return None, await loop.run_in_executor(None, _render_inline, record)
+
+
+def job_status(record: Dict[str, Any]) -> str:
+    """One of "ready", "queued", "rendering" or "missing" (never requested, or failed)."""
+    data, path = get_cached_report(record)
+    if data is not None or path is not None:
+        return "ready"
+    with _pending_lock:
+        fut = _pending.get(cache_path(record))
+    if fut is None:
+        return "missing"
+    return "rendering" if fut.running() else "queued"
+
+
+def queue_depth() -> int:
+    with _pending_lock:
+        return len(_pending)
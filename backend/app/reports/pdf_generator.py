@@ -1,55 +1,109 @@
 from __future__ import annotations
-from typing import Dict, Any, List, Optional
-import io
-import os
+from typing import Dict, Any, List, Tuple, Union, BinaryIO
+from functools import lru_cache
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
 from reportlab.lib import colors
 
+# Bump whenever the rendered layout changes so cached reports are re-rendered
+TEMPLATE_VERSION = "2"
 
-def _draw_header(c: canvas.Canvas, title: str):
-    c.setFont("Helvetica-Bold", 18)
-    c.setFillColor(colors.teal)
-    c.drawString(1 * inch, 10.5 * inch, title)
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 10)
+REPORT_TITLE = "Consultation Report"
+DISCLAIMER = (
+    "These results are informational and not a diagnosis. If symptoms persist or worsen, "
+    "please consult a medical professional."
+)
 
+_TOP_Y = 10.1 * inch
+_BOTTOM_Y = 0.9 * inch
+_LEFT_X = 1 * inch
+_TEXT_WIDTH = 6 * inch
+_BODY_FONT = ("Helvetica", 10)
+_SECTION_FONT = ("Helvetica-Bold", 12)
+_HEADER_FORM = "report_header"
 
-def _draw_section_title(c: canvas.Canvas, y: float, text: str) -> float:
-    c.setFont("Helvetica-Bold", 12)
-    c.setFillColor(colors.darkgreen)
-    c.drawString(1 * inch, y, text)
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 10)
-    return y - 0.2 * inch
 
+def _split_lines(text: str, width: float) -> Tuple[str, ...]:
+    return tuple(simpleSplit(text, _BODY_FONT[0], _BODY_FONT[1], width))
 
-def _draw_wrapped_text(c: canvas.Canvas, text: str, x: float, y: float, width: float, leading: float = 12) -> float:
-    from reportlab.lib.utils import simpleSplit
-    lines = simpleSplit(text, 'Helvetica', 10, width)
-    for line in lines:
-        c.drawString(x, y, line)
-        y -= leading / 72.0 * inch
-    return y
 
+@lru_cache(maxsize=64)
+def _split_static(text: str, width: float) -> Tuple[str, ...]:
+    # Only fixed template text (disclaimer, labels) comes through here, never patient data
+    return _split_lines(text, width)
 
-def generate_pdf(record: Dict[str, Any], output_dir: Optional[str] = None) -> bytes:
-    """Generate a consultation PDF from a prediction record (intake + predictions).
-    Returns PDF bytes; optionally writes to output_dir and returns the same bytes.
+
+class _PageLayout:
+    """Flowing layout on a ReportLab canvas: tracks the `y` cursor, starts a new
+    page whenever the next line would cross the bottom margin, and stamps the
+    header (drawn once as a reusable form XObject) plus a page number on each page.
+    """
+
+    def __init__(self, c: canvas.Canvas, title: str):
+        self.c = c
+        self.page = 0
+        self.y = _TOP_Y
+        # Header is identical on every page: draw it once, reference it per page
+        c.beginForm(_HEADER_FORM)
+        c.setFont("Helvetica-Bold", 18)
+        c.setFillColor(colors.teal)
+        c.drawString(_LEFT_X, 10.5 * inch, title)
+        c.endForm()
+        self._start_page()
+
+    def _start_page(self) -> None:
+        self.page += 1
+        self.y = _TOP_Y
+        self.c.doForm(_HEADER_FORM)
+        self.c.setFillColor(colors.grey)
+        self.c.setFont("Helvetica", 8)
+        self.c.drawRightString(_LEFT_X + _TEXT_WIDTH, 0.5 * inch, f"Page {self.page}")
+        self.c.setFillColor(colors.black)
+        self.c.setFont(*_BODY_FONT)
+
+    def new_page(self) -> None:
+        self.c.showPage()
+        self._start_page()
+
+    def ensure(self, height: float) -> None:
+        if self.y - height < _BOTTOM_Y:
+            self.new_page()
+
+    def section(self, text: str) -> None:
+        # Keep a section title together with at least its first body line
+        self.ensure(0.2 * inch + 12 / 72.0 * inch)
+        self.c.setFont(*_SECTION_FONT)
+        self.c.setFillColor(colors.darkgreen)
+        self.c.drawString(_LEFT_X, self.y, text)
+        self.c.setFillColor(colors.black)
+        self.c.setFont(*_BODY_FONT)
+        self.y -= 0.2 * inch
+
+    def text(
+        self, text: str, x: float = _LEFT_X, width: float = _TEXT_WIDTH, leading: float = 12, static: bool = False
+    ) -> None:
+        """Draw wrapped text; pass static=True for template strings so their wrapping is memoized."""
+        step = leading / 72.0 * inch
+        for line in (_split_static if static else _split_lines)(text, width):
+            self.ensure(step)
+            self.c.drawString(x, self.y, line)
+            self.y -= step
+
+
+def write_pdf(record: Dict[str, Any], out: Union[str, BinaryIO]) -> None:
+    """Render a consultation PDF for `record` into `out` (a path or binary file object).
+    Long content flows onto as many pages as needed.
     """
     intake: Dict[str, Any] = record.get("intake", {}) or {}
     predictions: List[Dict[str, Any]] = record.get("predictions", []) or []
 
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=letter)
+    c = canvas.Canvas(out, pagesize=letter)
+    layout = _PageLayout(c, REPORT_TITLE)
 
-    # Header
-    _draw_header(c, "Consultation Report")
-
-    y = 10.1 * inch
     # Patient info
-    y = _draw_section_title(c, y, "Patient & Intake")
+    layout.section("Patient & Intake")
     intake_parts = []
     for k in ["age", "sex", "height", "weight", "systolic", "diastolic", "glucose"]:
         v = intake.get(k)
@@ -57,53 +111,45 @@ def generate_pdf(record: Dict[str, Any], output_dir: Optional[str] = None) -> by
             intake_parts.append(f"{k.capitalize()}: {v}")
     if intake.get("symptoms"):
         intake_parts.append("Symptoms: " + ", ".join(intake.get("symptoms")))
-    y = _draw_wrapped_text(c, " • ".join(intake_parts) or "No intake data provided.", 1 * inch, y, 6 * inch)
+    if intake_parts:
+        layout.text(" • ".join(intake_parts))
+    else:
+        layout.text("No intake data provided.", static=True)
 
     # Risk summary
-    y = _draw_section_title(c, y, "Risk Summary")
+    layout.section("Risk Summary")
     for p in predictions:
         disease = p.get("disease", "Disease")
         prob = p.get("probability", 0)
         band = (p.get("risk_band") or "").upper()
         pct = round(float(prob) * 100)
-        line = f"{disease}: {pct}% ({band})"
-        y = _draw_wrapped_text(c, line, 1 * inch, y, 6 * inch)
+        layout.text(f"{disease}: {pct}% ({band})")
 
     # SHAP top features
-    y = _draw_section_title(c, y, "Top Contributing Factors")
+    layout.section("Top Contributing Factors")
     for p in predictions:
         disease = p.get("disease", "Disease")
         feats = p.get("top_features") or []
         if not feats:
             continue
-        y = _draw_wrapped_text(c, f"{disease}: " + ", ".join(feats[:5]), 1 * inch, y, 6 * inch)
+        layout.text(f"{disease}: " + ", ".join(feats[:5]))
 
     # Recommendations & Explanation
-    y = _draw_section_title(c, y, "Recommendations & Explanation")
+    layout.section("Recommendations & Explanation")
     for p in predictions:
         disease = p.get("disease", "Disease")
         recs = p.get("recommendations") or []
         expl = p.get("explanation") or ""
-        y = _draw_wrapped_text(c, f"{disease}:", 1 * inch, y, 6 * inch)
+        layout.text(f"{disease}:", static=True)
         if recs:
-            y = _draw_wrapped_text(c, "  - " + "\n  - ".join(recs), 1 * inch, y, 6 * inch)
+            layout.text("  - " + "\n  - ".join(recs))
         if expl:
-            y = _draw_wrapped_text(c, "  Explanation: " + expl, 1 * inch, y, 6 * inch)
+            layout.text("  Explanation: " + expl)
 
     # Final notice
-    y = _draw_section_title(c, y, "Important")
-    y = _draw_wrapped_text(c, "These results are informational and not a diagnosis. If symptoms persist or worsen, please consult a medical professional.", 1 * inch, y, 6 * inch)
+    layout.section("Important")
+    layout.text(DISCLAIMER, static=True)
 
     c.showPage()
     c.save()
 
-    pdf_bytes = buf.getvalue()
-    buf.close()
-
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-        out_path = os.path.join(output_dir, f"report_{record.get('id','unknown')}.pdf")
-        with open(out_path, 'wb') as f:
-            f.write(pdf_bytes)
-    
-    return pdf_bytes
@@ -34,3 +34,7 @@ class HealthIntake(BaseModel):
                 "wearableImported": False,
             }
         }
+
+
+class HealthIntakeBatch(BaseModel):
+    items: List[HealthIntake] = Field(default_factory=list, max_length=500)
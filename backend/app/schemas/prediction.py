@@ -12,3 +12,10 @@ class PredictionItem(BaseModel):
 class PredictionResponse(BaseModel):
     prediction_id: str
     predictions: List[PredictionItem]
+    # LLM admission state when this response was built (ok|shedding|degraded|open|disabled),
+    # reported as "degraded" if any explanation here is the mock text; only "ok"
+    # guarantees every explanation came from Gemini
+    llm_status: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[PredictionResponse]
@@ -0,0 +1,198 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and an optional on-disk tier.
+
+    The memory tier holds at most `max_entries` items (least recently used are
+    evicted). When `disk_dir` is set, values must be JSON-serializable; they are
+    also written there (one file per key) so they survive restarts, and a memory
+    miss falls through to disk before counting as a miss. The disk tier keeps at
+    most `disk_max_entries` files: a disk hit touches the file, and writes sweep
+    expired files (at most every `disk_sweep_s` seconds, or as soon as the cap is
+    exceeded) and then evict the least recently used ones by mtime.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        disk_max_entries: int = 10000,
+        disk_sweep_s: float = 600.0,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_entries = max(1, disk_max_entries)
+        self.disk_sweep_s = disk_sweep_s
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._disk_files = 0
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_sweep(time.time())
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+        entry = self._disk_get(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, entry[0], entry[1])
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store `value`; `ttl` overrides the cache-wide TTL for this entry."""
+        if not self.enabled:
+            return
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._put_memory(key, expires, value)
+        self._disk_set(key, expires, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_files": self._disk_files,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def _put_memory(self, key: str, expires: float, value: Any) -> None:
+        """Caller holds _lock."""
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if float(data["expires"]) > now:
+                os.utime(path)  # mtime is the disk tier's LRU clock
+                return float(data["expires"]), data["value"]
+            os.remove(path)
+            with self._lock:
+                self._disk_files = max(0, self._disk_files - 1)
+        except Exception:
+            pass
+        return None
+
+    def _disk_set(self, key: str, expires: float, value: Any) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            existed = os.path.exists(path)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({"expires": expires, "value": value}, f)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        now = time.time()
+        with self._lock:
+            if not existed:
+                self._disk_files += 1
+            due = self._disk_files > self.disk_max_entries or now - self._last_sweep >= self.disk_sweep_s
+        if due:
+            self._disk_sweep(now)
+
+    def _disk_sweep(self, now: float) -> None:
+        """Drop expired files, then the least recently used ones down to the cap."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return  # another writer is already sweeping
+        try:
+            live = []
+            try:
+                scan = list(os.scandir(self.disk_dir or ""))
+            except OSError:
+                return
+            for ent in scan:
+                try:
+                    mtime = ent.stat().st_mtime
+                    if ent.name.endswith(".tmp"):
+                        if now - mtime > 60:  # left behind by a crashed writer
+                            os.remove(ent.path)
+                        continue
+                    if not ent.name.endswith(".json"):
+                        continue
+                    with open(ent.path, 'r', encoding='utf-8') as f:
+                        expires = float(json.load(f)["expires"])
+                    if expires <= now:
+                        os.remove(ent.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                except Exception:
+                    # unreadable entry: it would never hit, so reclaim the space
+                    try:
+                        os.remove(ent.path)
+                    except OSError:
+                        pass
+                    continue
+                live.append((mtime, ent.path))
+            evicted = 0
+            if len(live) > self.disk_max_entries:
+                # trim to 90% so a full tier is not rescanned on every new key
+                keep = self.disk_max_entries - self.disk_max_entries // 10
+                live.sort()
+                for _, path in live[: len(live) - keep]:
+                    try:
+                        os.remove(path)
+                        evicted += 1
+                    except OSError:
+                        pass
+            with self._lock:
+                self._disk_files = len(live) - evicted
+                self._last_sweep = now
+                self.disk_evictions += evicted
+        finally:
+            self._sweep_lock.release()
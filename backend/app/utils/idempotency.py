@@ -0,0 +1,157 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from fastapi import HTTPException
+
+# Header clients send to make a POST safe to retry, and the header set on
+# responses that were served from an earlier (or concurrent) request
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyConflict(HTTPException):
+    """An Idempotency-Key was reused for a different request (422), or while a
+    different request with that key is still running (409).
+    """
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Single-flight execution plus replay of completed responses, per key.
+
+    The first request for a key runs `fn`; concurrent requests with the same
+    key wait for that result instead of computing again, and later requests
+    within `ttl` seconds get the stored response. Completed entries are kept in
+    an LRU of at most `max_entries`. Failures are not stored, so a retry after
+    an error runs again.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # key -> (expires, fingerprint, response)
+        self._done: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        # key -> (fingerprint, future) for requests still running
+        self._inflight: Dict[str, Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+        self.replays = 0
+        self.coalesced = 0
+
+    def _claim(self, key: str, fp: str) -> Tuple[str, Any]:
+        """("done", response), ("wait", future) or ("own", future) for this request."""
+        now = time.time()
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._done[key]
+                entry = None
+            if entry is not None:
+                if entry[1] != fp:
+                    raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+                self._done.move_to_end(key)
+                self.replays += 1
+                return "done", entry[2]
+            running = self._inflight.get(key)
+            if running is not None:
+                if running[0] != fp:
+                    raise IdempotencyConflict(409, "A different request with this Idempotency-Key is in progress")
+                self.coalesced += 1
+                return "wait", running[1]
+            fut: Future = Future()
+            self._inflight[key] = (fp, fut)
+            return "own", fut
+
+    def _settle(self, key: str, fp: str, fut: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._done[key] = (time.time() + self.ttl, fp, result)
+                self._done.move_to_end(key)
+                while len(self._done) > self.max_entries:
+                    self._done.popitem(last=False)
+        if error is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(error)
+
+    def run(self, key: str, fp: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (response, replayed). `replayed` is True when the response came
+        from an earlier or concurrent request with the same key.
+        """
+        state, value = self._claim(key, fp)
+        if state == "done":
+            return value, True
+        if state == "wait":
+            return value.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, fp, value, error=e)
+            raise
+        self._settle(key, fp, value, result)
+        return result, False
+
+    async def run_async(self, key: str, fp: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """run() for coroutine functions; waiters await the owner without blocking a thread."""
+        state, value = self._claim(key, fp)
+        if state == "done":
+            return value, True
+        if state == "wait":
+            # shield: a waiter going away must not cancel the owner's result
+            return await asyncio.shield(asyncio.wrap_future(value)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._settle(key, fp, value, error=e)
+            raise
+        self._settle(key, fp, value, result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._done),
+                "inflight": len(self._inflight),
+                "replays": self.replays,
+                "coalesced": self.coalesced,
+            }
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(
+                    max_entries=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000")),
+                    ttl=float(os.getenv("IDEMPOTENCY_TTL_S", "86400")),
+                )
+    return _store
+
+
+def run_idempotent(scope: str, key: Optional[str], payload: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """Run `fn` under `key` (scoped by endpoint/user), or directly when no key was sent."""
+    if not key:
+        return fn(), False
+    return get_store().run(f"{scope}:{key}", fingerprint(payload), fn)
+
+
+async def run_idempotent_async(scope: str, key: Optional[str], payload: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    """run_idempotent() for async routes."""
+    if not key:
+        return await fn(), False
+    return await get_store().run_async(f"{scope}:{key}", fingerprint(payload), fn)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import math
+import os
+import threading
+import time
+
+# In-process counters and histograms rendered in the Prometheus text format by
+# GET /metrics. Recording is a lock plus a few integer updates; nothing is
+# formatted until a scrape. Cache hit/miss figures are not recorded on the hot
+# path at all: collectors read each cache's own stats() at scrape time.
+# METRICS_ENABLED=0 turns recording into a no-op.
+
+_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Seconds; spans sub-millisecond feature building up to slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _fmt_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        if not _ENABLED:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def collect(self) -> Tuple[str, List[Sample]]:
+        with self._lock:
+            items = list(self._values.items())
+        return "counter", [(self.name, dict(zip(self.labelnames, lv)), v) for lv, v in items]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (last slot is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if not _ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """Observe the wall time of the block; also usable as a decorator."""
+        if not _ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def collect(self) -> Tuple[str, List[Sample]]:
+        with self._lock:
+            items = [(lv, list(s[0]), s[1]) for lv, s in self._series.items()]
+        samples: List[Sample] = []
+        for lv, counts, total in items:
+            labels = dict(zip(self.labelnames, lv))
+            running = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                running += n
+                samples.append((f"{self.name}_bucket", {**labels, "le": _fmt_value(bound)}, running))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, running))
+        return "histogram", samples
+
+
+_metrics: List = []
+_collectors: List[Tuple[str, str, str, Callable[[], List[Sample]]]] = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric) -> None:
+    with _registry_lock:
+        _metrics.append(metric)
+
+
+def register_collector(name: str, help: str, kind: str, fn: Callable[[], List[Sample]]) -> None:
+    """Add a metric whose samples are computed by `fn` at scrape time."""
+    with _registry_lock:
+        _collectors.append((name, help, kind, fn))
+
+
+_cache_sources: List[Tuple[str, Callable[[], Dict[str, int]]]] = []
+
+
+def register_cache(cache: str, stats: Callable[[], Dict[str, int]]) -> None:
+    """Expose a cache's stats() (hits, misses, size; disk_hits if present) under label cache=<name>."""
+    with _registry_lock:
+        _cache_sources.append((cache, stats))
+
+
+def _cache_samples(field: str, metric: str) -> Callable[[], List[Sample]]:
+    def collect() -> List[Sample]:
+        with _registry_lock:
+            sources = list(_cache_sources)
+        out: List[Sample] = []
+        for cache, stats in sources:
+            try:
+                s = stats()
+            except Exception:
+                continue
+            value = s.get(field, 0) + (s.get("disk_hits", 0) if field == "hits" else 0)
+            out.append((metric, {"cache": cache}, float(value)))
+        return out
+    return collect
+
+
+register_collector("caremate_cache_hits_total", "Cache hits (memory and disk tiers)", "counter",
+                   _cache_samples("hits", "caremate_cache_hits_total"))
+register_collector("caremate_cache_misses_total", "Cache misses", "counter",
+                   _cache_samples("misses", "caremate_cache_misses_total"))
+register_collector("caremate_cache_entries", "Entries held in memory", "gauge",
+                   _cache_samples("size", "caremate_cache_entries"))
+
+
+STAGE_SECONDS = Histogram("caremate_stage_seconds", "Time spent per pipeline stage", ("stage",))
+
+
+def timed(stage: str):
+    """Time a block or function into caremate_stage_seconds{stage=...}:
+
+        with timed("inference"): ...
+
+        @timed("state_flush")
+        def _flush(...): ...
+    """
+    return STAGE_SECONDS.time(stage)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    lines: List[str] = []
+
+    def emit(name: str, help: str, kind: str, samples: List[Sample]) -> None:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sname, labels, value in samples:
+            lines.append(f"{sname}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    for m in metrics:
+        kind, samples = m.collect()
+        emit(m.name, m.help, kind, samples)
+    for name, help, kind, fn in collectors:
+        try:
+            samples = fn()
+        except Exception:
+            continue
+        emit(name, help, kind, samples)
+    return "\n".join(lines) + "\n"
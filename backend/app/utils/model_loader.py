@@ -1,37 +1,234 @@
 from __future__ import annotations
 import os
-from typing import Dict, Optional
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
 try:
     import joblib  # type: ignore
 except Exception:  # pragma: no cover
     joblib = None
 
+# Optional SHAP; guarded import
+try:  # pragma: no cover
+    import shap  # type: ignore
+except Exception:  # pragma: no cover
+    shap = None
+
 _MODEL_CACHE: Dict[str, object] = {}
+# name -> {"path", "mtime", "size", "loaded_at", "checked_at"} for the cached model
+_MODEL_META: Dict[str, Dict[str, Any]] = {}
+# name -> time of the last lookup that found no model file (negative cache)
+_MISSING: Dict[str, float] = {}
+# Per-model load locks so concurrent first requests load a model only once
+_load_locks: Dict[str, threading.Lock] = {}
+_load_locks_guard = threading.Lock()
+# name -> (model the explainer was built for, explainer); rebuilt if the model object changes
+_EXPLAINER_CACHE: Dict[str, Tuple[object, object]] = {}
+_explainer_lock = threading.Lock()
+
+MODEL_SUFFIXES = (".pkl", ".joblib")
+
+
+def _reload_interval() -> float:
+    # Seconds between mtime checks for hot reload; 0 disables reloading
+    return float(os.getenv("MODEL_RELOAD_INTERVAL_S", "5"))
+
+
+def _missing_ttl() -> float:
+    return float(os.getenv("MODEL_MISSING_TTL_S", "30"))
+
+
+def _load_lock(key: str) -> threading.Lock:
+    with _load_locks_guard:
+        lock = _load_locks.get(key)
+        if lock is None:
+            lock = _load_locks[key] = threading.Lock()
+        return lock
+
+
+def _find_path(model_dir: str, key: str) -> Optional[str]:
+    for suffix in MODEL_SUFFIXES:
+        path = os.path.join(model_dir, f"{key}{suffix}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load_file(path: str) -> object:
+    # mmap_mode lets forked workers share the pages of large numpy arrays
+    # stored uncompressed in the artifact; compressed pickles load normally
+    if os.getenv("MODEL_MMAP", "1").lower() in ("1", "true", "yes"):
+        try:
+            return joblib.load(path, mmap_mode="r")
+        except Exception:
+            pass
+    return joblib.load(path)
+
+
+def _load(model_dir: str, key: str) -> Optional[object]:
+    """Load (or reload) a model from disk and publish it. Caller holds the key's load lock."""
+    path = _find_path(model_dir, key)
+    now = time.time()
+    if path is None:
+        _MISSING[key] = now
+        return _MODEL_CACHE.get(key)
+    try:
+        st = os.stat(path)
+        model = _load_file(path)
+    except Exception:
+        # Keep serving the previous version if a reload fails (e.g. half-written file)
+        _MISSING[key] = now
+        return _MODEL_CACHE.get(key)
+    # Swap the reference: in-flight requests keep using the object they already hold
+    _MODEL_CACHE[key] = model
+    _MODEL_META[key] = {
+        "model": model,
+        "path": path,
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "loaded_at": now,
+        "checked_at": now,
+    }
+    _MISSING.pop(key, None)
+    return model
+
+
+def _is_stale(key: str) -> bool:
+    interval = _reload_interval()
+    meta = _MODEL_META.get(key)
+    if interval <= 0 or meta is None:
+        return False
+    now = time.time()
+    if now - meta["checked_at"] < interval:
+        return False
+    meta["checked_at"] = now
+    try:
+        st = os.stat(meta["path"])
+    except OSError:
+        return False
+    return st.st_mtime != meta["mtime"] or st.st_size != meta["size"]
 
 
 def get_model(model_dir: str, name: str) -> Optional[object]:
     """Load and cache a disease model by name (e.g., 'diabetes', 'heart', 'kidney').
     Looks for files like '<name>.pkl' or '<name>.joblib' in model_dir.
     Returns None if not found or joblib unavailable.
+
+    A cached model is hot-reloaded when its file's mtime/size changes (checked at
+    most every MODEL_RELOAD_INTERVAL_S); a missing model is re-looked-up only every
+    MODEL_MISSING_TTL_S instead of on every call.
     """
     key = name.lower()
-    if key in _MODEL_CACHE:
-        return _MODEL_CACHE[key]
+    model = _MODEL_CACHE.get(key)
+    if model is not None and not _is_stale(key):
+        return model
 
     if not joblib:
         return None
+    missing_since = _MISSING.get(key)
+    if model is None and missing_since is not None and time.time() - missing_since < _missing_ttl():
+        return None
 
-    candidates = [
-        os.path.join(model_dir, f"{key}.pkl"),
-        os.path.join(model_dir, f"{key}.joblib"),
-    ]
-    for path in candidates:
-        if os.path.exists(path):
+    with _load_lock(key):
+        current = _MODEL_CACHE.get(key)
+        if current is not None and current is not model:
+            # Another thread loaded or reloaded it while we waited
+            return current
+        return _load(model_dir, key)
+
+
+def _dummy_input(model: object, n_features: int):
+    import numpy as np
+    return np.zeros((1, int(getattr(model, "n_features_in_", n_features))), dtype=float)
+
+
+def warmup(model_dir: str, n_features: int) -> Dict[str, Dict[str, Any]]:
+    """Load every model artifact in model_dir, run one dummy inference and build its
+    SHAP explainer, so the first real request pays none of these costs.
+    """
+    try:
+        names = sorted({os.path.splitext(f)[0].lower() for f in os.listdir(model_dir) if f.endswith(MODEL_SUFFIXES)})
+    except OSError:
+        names = []
+    for name in names:
+        model = get_model(model_dir, name)
+        if model is None:
+            continue
+        try:
+            x = _dummy_input(model, n_features)
+            if hasattr(model, "predict_proba"):
+                model.predict_proba(x)
+            elif hasattr(model, "predict"):
+                model.predict(x)
+            explainer = get_explainer(name, model)
+            if explainer is not None:
+                explainer(x)
+        except Exception:
+            pass
+    return loaded_models()
+
+
+def model_version(name: str, model: object) -> Optional[str]:
+    """Version of the artifact `model` was loaded from, or None if `model` is not
+    the object currently registered under `name` (e.g. a reload swapped it out).
+    """
+    meta = _MODEL_META.get(name.lower())
+    if meta is None or meta.get("model") is not model:
+        return None
+    # Full-precision mtime: the same staleness test _is_stale() applies
+    return f"{meta['mtime']!r}-{meta['size']}"
+
+
+def loaded_models() -> Dict[str, Dict[str, Any]]:
+    """Versions of the models currently served, for /health."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, meta in list(_MODEL_META.items()):
+        out[key] = {
+            "file": os.path.basename(meta["path"]),
+            "version": f"{int(meta['mtime'])}-{meta['size']}",
+            "loaded_at": datetime.utcfromtimestamp(meta["loaded_at"]).isoformat(),
+        }
+    return out
+
+
+def _is_tree_model(model: object) -> bool:
+    cls = type(model).__name__
+    module = type(model).__module__ or ""
+    return (
+        hasattr(model, "tree_")
+        or hasattr(model, "estimators_")
+        or module.startswith(("xgboost", "lightgbm", "catboost"))
+        or cls.startswith(("XGB", "LGBM", "CatBoost"))
+    )
+
+
+def get_explainer(name: str, model: Optional[object]) -> Optional[object]:
+    """Return a cached SHAP explainer for a loaded model, building it on first use.
+    Tree ensembles (sklearn trees/forests, XGBoost, ...) use shap.TreeExplainer directly.
+    Returns None if SHAP is unavailable or no explainer can be built for the model.
+    """
+    if shap is None or model is None:
+        return None
+    key = name.lower()
+    cached = _EXPLAINER_CACHE.get(key)
+    if cached is not None and cached[0] is model:
+        return cached[1]
+    with _explainer_lock:
+        cached = _EXPLAINER_CACHE.get(key)
+        if cached is not None and cached[0] is model:
+            return cached[1]
+        explainer = None
+        if _is_tree_model(model):
             try:
-                model = joblib.load(path)
-                _MODEL_CACHE[key] = model
-                return model
+                explainer = shap.TreeExplainer(model)
+            except Exception:
+                explainer = None
+        if explainer is None:
+            try:
+                explainer = shap.Explainer(model)
             except Exception:
                 return None
-    return None
+        _EXPLAINER_CACHE[key] = (model, explainer)
+        return explainer
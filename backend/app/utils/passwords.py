@@ -0,0 +1,156 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+import asyncio
+import atexit
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from .metrics import Histogram, register_collector
+
+try:  # pragma: no cover
+    import bcrypt  # type: ignore
+except Exception:  # pragma: no cover
+    bcrypt = None  # type: ignore
+
+# Password hashing off the request path. bcrypt is deliberately slow CPU work,
+# so the async helpers run it on a small process pool (AUTH_HASH_WORKERS,
+# default 2; 0 uses one background thread) and refuse new work with
+# HashPoolBusy once AUTH_HASH_QUEUE_MAX jobs are waiting, so a login burst
+# cannot take the rest of the API down with it. The cost factor comes from
+# BCRYPT_COST; needs_rehash() tells login when a stored hash should be upgraded.
+
+_BCRYPT_MAX_BYTES = 72
+
+QUEUE_SECONDS = Histogram(
+    "caremate_auth_hash_queue_seconds", "Time password hash/verify jobs waited for a worker", ("op",)
+)
+WORK_SECONDS = Histogram("caremate_auth_hash_seconds", "CPU time of password hash/verify jobs", ("op",))
+
+
+class HashPoolBusy(Exception):
+    """Too many password jobs are already queued; the caller should retry later."""
+
+
+def bcrypt_cost() -> int:
+    return max(4, min(31, int(os.getenv("BCRYPT_COST", "12"))))
+
+
+def _secret(password: str) -> bytes:
+    # bcrypt only looks at the first 72 bytes; newer releases raise instead of truncating
+    return password.encode("utf-8")[:_BCRYPT_MAX_BYTES]
+
+
+def hash_password(password: str, cost: Optional[int] = None) -> str:
+    if bcrypt is not None:
+        return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds=cost or bcrypt_cost())).decode("ascii")
+    # Fallback SHA256 (less secure; for local-only dev)
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    if not hashed:
+        return False
+    if hashed.startswith("$2"):
+        if bcrypt is None:
+            return False
+        try:
+            return bcrypt.checkpw(_secret(password), hashed.encode("ascii"))
+        except ValueError:
+            return False
+    return hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).hexdigest(), hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True for legacy SHA256 hashes and bcrypt hashes made with another cost factor."""
+    if bcrypt is None:
+        return False
+    if not hashed.startswith("$2"):
+        return True
+    try:
+        return int(hashed.split("$")[2]) != bcrypt_cost()
+    except (IndexError, ValueError):
+        return True
+
+
+def _work(op: str, password: str, arg: Any) -> Tuple[Any, float, float]:
+    """Runs in a worker: returns (result, wall-clock start, seconds spent)."""
+    started = time.time()
+    t0 = time.perf_counter()
+    result = hash_password(password, arg) if op == "hash" else verify_password(password, arg)
+    return result, started, time.perf_counter() - t0
+
+
+_pool: Optional[Any] = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                n = max(0, int(os.getenv("AUTH_HASH_WORKERS", "2")))
+                if n == 0:
+                    _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auth-hash")
+                else:
+                    _pool = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_shutdown)
+
+
+def _release(_fut: Any = None) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def _run(op: str, password: str, arg: Any) -> Any:
+    global _pending
+    with _pending_lock:
+        if _pending >= max(1, int(os.getenv("AUTH_HASH_QUEUE_MAX", "64"))):
+            raise HashPoolBusy()
+        _pending += 1
+    submitted = time.time()
+    try:
+        fut = _get_pool().submit(_work, op, password, arg)
+    except BaseException:
+        _release()
+        raise
+    # The slot is freed when the job itself finishes, not when this request stops
+    # waiting: a cancelled request leaves its job running in the pool, and the
+    # queue cap has to keep counting it
+    fut.add_done_callback(_release)
+    # shield: a client disconnect must not cancel a job the pool has already taken
+    result, started, spent = await asyncio.shield(asyncio.wrap_future(fut))
+    QUEUE_SECONDS.observe(max(0.0, started - submitted), op)
+    WORK_SECONDS.observe(spent, op)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run("hash", password, bcrypt_cost())
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run("verify", password, hashed)
+
+
+register_collector(
+    "caremate_auth_hash_pending",
+    "Password hash/verify jobs queued or running",
+    "gauge",
+    lambda: [("caremate_auth_hash_pending", {}, float(_pending))],
+)
@@ -0,0 +1,256 @@
+from __future__ import annotations
+from typing import Dict, Any, Optional, List, Tuple
+import json
+import os
+import sqlite3
+import threading
+
+# SQLite (WAL) storage backend for app.utils.state, selected with
+# STATE_BACKEND=sqlite. Unlike the in-process JSON store it is safe to share
+# between several uvicorn worker processes: WAL lets readers proceed while one
+# writer commits, and busy_timeout serializes concurrent writers.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions(created_at);
+CREATE TABLE IF NOT EXISTS consults (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    doctor_id TEXT,
+    prediction_id TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_consults_user_created ON consults(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_consults_created ON consults(created_at);
+CREATE INDEX IF NOT EXISTS idx_consults_doctor_created ON consults(doctor_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_consults_prediction ON consults(prediction_id);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT UNIQUE,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SQLiteStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # Predictions
+    def save_prediction(self, record: Dict[str, Any]) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO predictions (id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+            (record["id"], record.get("user_id"), record.get("created_at"), json.dumps(record)),
+        )
+
+    def save_predictions(self, records: List[Dict[str, Any]]) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions (id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+                [(r["id"], r.get("user_id"), r.get("created_at"), json.dumps(r)) for r in records],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_prediction(self, pid: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM predictions WHERE id = ?", (pid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_predictions(
+        self,
+        user_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        before: Optional[Tuple[str, str]] = None,
+        since: Optional[str] = None,
+        anonymous: bool = False,
+    ) -> List[Dict[str, Any]]:
+        clauses, args = self._prediction_filter(user_id, anonymous)
+        if before:
+            clauses.append("(IFNULL(created_at, ''), id) < (?, ?)")
+            args.extend(before)
+        if since:
+            clauses.append("created_at > ?")
+            args.append(since)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        sql = f"SELECT data FROM predictions{where} ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [json.loads(r[0]) for r in self._conn().execute(sql, args)]
+
+    def predictions_version(self, user_id: Optional[str] = None, anonymous: bool = False) -> str:
+        clauses, args = self._prediction_filter(user_id, anonymous)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        count = self._conn().execute(f"SELECT COUNT(*) FROM predictions{where}", args).fetchone()[0]
+        row = self._conn().execute(
+            f"SELECT IFNULL(created_at, ''), id FROM predictions{where} ORDER BY created_at DESC, id DESC LIMIT 1",
+            args,
+        ).fetchone()
+        newest = row or ("", "")
+        return f"{count}:{newest[0]}:{newest[1]}"
+
+    @staticmethod
+    def _prediction_filter(user_id: Optional[str], anonymous: bool = False) -> Tuple[List[str], List[Any]]:
+        if anonymous:
+            return ["(user_id IS NULL OR user_id = '')"], []
+        if user_id:
+            return ["user_id = ?"], [user_id]
+        return [], []
+
+    # Consults
+    def save_consult(self, record: Dict[str, Any]) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO consults (id, user_id, doctor_id, prediction_id, created_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                record["id"],
+                record.get("user_id"),
+                record.get("doctor_id"),
+                record.get("prediction_id"),
+                record.get("created_at"),
+                json.dumps(record),
+            ),
+        )
+
+    def list_consults(
+        self,
+        user_id: Optional[str] = None,
+        doctor_id: Optional[str] = None,
+        prediction_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        clauses, args = [], []
+        for col, val in (("user_id", user_id), ("doctor_id", doctor_id), ("prediction_id", prediction_id)):
+            if val:
+                clauses.append(f"{col} = ?")
+                args.append(val)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = self._conn().execute(f"SELECT data FROM consults{where} ORDER BY created_at DESC", args)
+        return [json.loads(r[0]) for r in rows]
+
+    # Users
+    def save_user(self, user: Dict[str, Any]) -> None:
+        try:
+            self._conn().execute(
+                "INSERT INTO users (id, email, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET email = excluded.email, data = excluded.data",
+                (user["id"], user.get("email"), user.get("created_at"), json.dumps(user)),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError("email already exists")
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_users(self) -> List[Dict[str, Any]]:
+        return [json.loads(r[0]) for r in self._conn().execute("SELECT data FROM users")]
+
+    def migrate_from_json(self, data_dir: str) -> bool:
+        """Import predictions.json, consults.json, users.json and any journal from data_dir once.
+        Runs inside one IMMEDIATE transaction so only the first worker to start imports.
+        Returns True if this call performed the import.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                conn.execute("COMMIT")
+                return False
+            preds = _read_json(os.path.join(data_dir, "predictions.json"), dict)
+            consults = _read_json(os.path.join(data_dir, "consults.json"), list)
+            users = _read_json(os.path.join(data_dir, "users.json"), dict)
+            # Entries not yet compacted out of a journal-mode store (see state.py)
+            journal = os.path.join(data_dir, "journal.jsonl")
+            for entry in _read_journal(journal + ".compacting") + _read_journal(journal):
+                rec = entry["r"]
+                if entry["c"] == "predictions":
+                    preds[rec["id"]] = rec
+                elif entry["c"] == "consults":
+                    consults.append(rec)
+                elif entry["c"] == "users":
+                    users[rec["id"]] = rec
+            for r in preds.values():
+                conn.execute(
+                    "INSERT OR IGNORE INTO predictions (id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+                    (r.get("id"), r.get("user_id"), r.get("created_at"), json.dumps(r)),
+                )
+            for r in consults:
+                conn.execute(
+                    "INSERT OR IGNORE INTO consults (id, user_id, doctor_id, prediction_id, created_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (r.get("id"), r.get("user_id"), r.get("doctor_id"), r.get("prediction_id"),
+                     r.get("created_at"), json.dumps(r)),
+                )
+            for r in users.values():
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (id, email, created_at, data) VALUES (?, ?, ?, ?)",
+                    (r.get("id"), r.get("email"), r.get("created_at"), json.dumps(r)),
+                )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _read_json(path: str, kind: type) -> Any:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            return data if isinstance(data, kind) else kind()
+    except Exception:
+        return kind()
+
+
+def _read_journal(path: str) -> List[Dict[str, Any]]:
+    entries: List[Dict[str, Any]] = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except Exception:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+if __name__ == "__main__":
+    # Manual migration: python -m app.utils.sqlite_store [DATA_DIR] [DB_PATH]
+    import sys
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATA_DIR", "./app/data")
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(data_dir, "caremate.db")
+    done = SQLiteStore(db_path).migrate_from_json(data_dir)
+    print("migrated" if done else "already migrated")
@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import atexit
+import bisect
 import threading
+import time
 import uuid
 import os
 import json
 from datetime import datetime
+from .sqlite_store import SQLiteStore
+from .metrics import Histogram, timed
 
 _lock = threading.Lock()
 _PREDICTIONS: Dict[str, Dict[str, Any]] = {}
@@ -12,6 +17,47 @@ _CONSULTS: List[Dict[str, Any]] = []
 _USERS: Dict[str, Dict[str, Any]] = {}
 _LOADED = False
 
+# Secondary indexes over the JSON store, rebuilt on load and maintained on
+# every write. Time-ordered lists hold (created_at, id) ascending.
+_EMAIL_INDEX: Dict[str, str] = {}
+_PRED_ORDER: List[Tuple[str, str]] = []
+_PRED_BY_USER: Dict[str, List[Tuple[str, str]]] = {}  # "" holds records saved without a user
+_CONSULT_BY_ID: Dict[str, Dict[str, Any]] = {}
+_CONSULT_ORDER: List[Tuple[str, str]] = []
+_CONSULT_INDEX: Dict[str, Dict[str, List[Tuple[str, str]]]] = {
+    "user_id": {},
+    "doctor_id": {},
+    "prediction_id": {},
+}
+
+# Journal mode (STATE_JOURNAL=1): every save appends one JSON line to
+# journal.jsonl instead of rewriting the collections. The *.json files become
+# a snapshot that a background compaction refreshes via temp file + rename.
+_JOURNAL = False
+_journal_fh = None
+_journal_ops = 0
+_compacting = False
+
+# Snapshot writes (journal off). STATE_DURABILITY picks when a save reaches disk:
+#   write     each save rewrites its collection before returning
+#   batch     (default) group commit: saves arriving within STATE_GROUP_COMMIT_MS
+#             of each other share one write by the background flusher; each
+#             save still returns only once its data is on disk
+#   interval  saves return at once; the flusher writes every
+#             STATE_FLUSH_INTERVAL_S and at exit, so a crash loses at most that window
+# Only collections changed since the last write are rewritten. STATE_FSYNC=1
+# fsyncs each file before it is renamed into place.
+_DURABILITY_MODES = ("write", "batch", "interval")
+COMMIT_BATCH = Histogram(
+    "caremate_state_commit_batch_saves",
+    "Saves covered by one snapshot write",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+# Backend selection: STATE_BACKEND=json (default, in-process dicts + files
+# above) or sqlite (shared across worker processes, see sqlite_store.py).
+_SQLITE: Optional[SQLiteStore] = None
+
 def _data_dir() -> str:
     d = os.getenv("DATA_DIR", "./app/data")
     os.makedirs(d, exist_ok=True)
@@ -26,122 +72,554 @@ def _consult_path() -> str:
 def _users_path() -> str:
     return os.path.join(_data_dir(), "users.json")
 
-def _load() -> None:
-    global _LOADED, _PREDICTIONS, _CONSULTS
-    if _LOADED:
-        return
+def _sqlite() -> Optional[SQLiteStore]:
+    """Return the SQLite backend when STATE_BACKEND=sqlite, else None."""
+    global _SQLITE
+    if os.getenv("STATE_BACKEND", "json").lower() != "sqlite":
+        return None
+    if _SQLITE is None:
+        with _lock:
+            if _SQLITE is None:
+                path = os.getenv("STATE_DB_PATH") or os.path.join(_data_dir(), "caremate.db")
+                store = SQLiteStore(path)
+                store.migrate_from_json(_data_dir())
+                _SQLITE = store
+    return _SQLITE
+
+def _journal_path() -> str:
+    return os.path.join(_data_dir(), "journal.jsonl")
+
+def _compacting_path() -> str:
+    return _journal_path() + ".compacting"
+
+def _journal_enabled() -> bool:
+    return os.getenv("STATE_JOURNAL", "0").lower() in ("1", "true", "yes")
+
+def _durability() -> str:
+    mode = os.getenv("STATE_DURABILITY", "batch").lower()
+    return mode if mode in _DURABILITY_MODES else "batch"
+
+def _group_commit_window() -> float:
     try:
-        with open(_pred_path(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                _PREDICTIONS = data
-    except Exception:
-        _PREDICTIONS = {}
+        return max(0.0, float(os.getenv("STATE_GROUP_COMMIT_MS", "2")) / 1000.0)
+    except ValueError:
+        return 0.002
+
+def _flush_interval() -> float:
     try:
-        with open(_consult_path(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                _CONSULTS = data
-    except Exception:
-        _CONSULTS = []
+        return max(0.01, float(os.getenv("STATE_FLUSH_INTERVAL_S", "1")))
+    except ValueError:
+        return 1.0
+
+def _fsync_enabled() -> bool:
+    return os.getenv("STATE_FSYNC", "0").lower() in ("1", "true", "yes")
+
+def _compact_threshold() -> int:
     try:
-        with open(_users_path(), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                _USERS = data
-    except Exception:
-        _USERS = {}
-    _LOADED = True
+        return max(1, int(os.getenv("STATE_JOURNAL_COMPACT_EVERY", "1000")))
+    except ValueError:
+        return 1000
 
-def _flush() -> None:
+def _apply(coll: str, record: Dict[str, Any], consult_ids: set) -> None:
+    """Apply a journal entry during replay; indexes are rebuilt afterwards."""
+    if coll == "predictions":
+        _PREDICTIONS[record["id"]] = record
+    elif coll == "consults":
+        # A crash between snapshot and journal cleanup can replay a consult twice
+        if record["id"] not in consult_ids:
+            consult_ids.add(record["id"])
+            _CONSULTS.append(record)
+    elif coll == "users":
+        _USERS[record["id"]] = record
+
+def _replay(path: str) -> int:
+    consult_ids = {c.get("id") for c in _CONSULTS}
+    n = 0
     try:
-        with open(_pred_path(), 'w', encoding='utf-8') as f:
-            json.dump(_PREDICTIONS, f, indent=2)
-    except Exception:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    _apply(entry["c"], entry["r"], consult_ids)
+                    n += 1
+                except Exception:
+                    # Torn tail from an interrupted append; skip it
+                    continue
+    except FileNotFoundError:
         pass
+    return n
+
+def _sorted_insert(entries: List[Tuple[str, str]], created: Optional[str], rid: str) -> None:
+    bisect.insort(entries, (created or '', rid))
+
+def _sorted_remove(entries: List[Tuple[str, str]], created: Optional[str], rid: str) -> None:
+    key = (created or '', rid)
+    i = bisect.bisect_left(entries, key)
+    if i < len(entries) and entries[i] == key:
+        del entries[i]
+
+def _index_prediction(record: Dict[str, Any]) -> None:
+    _sorted_insert(_PRED_ORDER, record.get("created_at"), record["id"])
+    uid = record.get("user_id") or ""
+    _sorted_insert(_PRED_BY_USER.setdefault(uid, []), record.get("created_at"), record["id"])
+
+def _unindex_prediction(record: Dict[str, Any]) -> None:
+    _sorted_remove(_PRED_ORDER, record.get("created_at"), record["id"])
+    uid = record.get("user_id") or ""
+    if uid in _PRED_BY_USER:
+        _sorted_remove(_PRED_BY_USER[uid], record.get("created_at"), record["id"])
+
+def _index_consult(record: Dict[str, Any]) -> None:
+    _CONSULT_BY_ID[record["id"]] = record
+    _sorted_insert(_CONSULT_ORDER, record.get("created_at"), record["id"])
+    for field, index in _CONSULT_INDEX.items():
+        key = record.get(field)
+        if key:
+            _sorted_insert(index.setdefault(key, []), record.get("created_at"), record["id"])
+
+def _unindex_consult(record: Dict[str, Any]) -> None:
+    _CONSULT_BY_ID.pop(record["id"], None)
+    _sorted_remove(_CONSULT_ORDER, record.get("created_at"), record["id"])
+    for field, index in _CONSULT_INDEX.items():
+        key = record.get(field)
+        if key and key in index:
+            _sorted_remove(index[key], record.get("created_at"), record["id"])
+
+def _index_user(user: Dict[str, Any]) -> None:
+    email = user.get("email")
+    if email:
+        _EMAIL_INDEX[email] = user["id"]
+
+def _rebuild_indexes() -> None:
+    _EMAIL_INDEX.clear()
+    _PRED_ORDER.clear()
+    _PRED_BY_USER.clear()
+    _CONSULT_BY_ID.clear()
+    _CONSULT_ORDER.clear()
+    for index in _CONSULT_INDEX.values():
+        index.clear()
+    for rec in _PREDICTIONS.values():
+        _index_prediction(rec)
+    for rec in _CONSULTS:
+        _index_consult(rec)
+    for user in _USERS.values():
+        _index_user(user)
+
+def _put_prediction(record: Dict[str, Any]) -> None:
+    old = _PREDICTIONS.get(record["id"])
+    if old is not None:
+        _unindex_prediction(old)
+    _PREDICTIONS[record["id"]] = record
+    _index_prediction(record)
+
+def _load() -> None:
+    global _LOADED, _PREDICTIONS, _CONSULTS, _USERS, _JOURNAL, _journal_fh, _journal_ops
+    if _LOADED:
+        return
+    with _lock:
+        if _LOADED:
+            return
+        try:
+            with open(_pred_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    _PREDICTIONS = data
+        except Exception:
+            _PREDICTIONS = {}
+        try:
+            with open(_consult_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                if isinstance(data, list):
+                    _CONSULTS = data
+        except Exception:
+            _CONSULTS = []
+        try:
+            with open(_users_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                if isinstance(data, dict):
+                    _USERS = data
+        except Exception:
+            _USERS = {}
+        _JOURNAL = _journal_enabled()
+        if _JOURNAL:
+            _journal_ops = _replay(_compacting_path()) + _replay(_journal_path())
+            _journal_fh = open(_journal_path(), 'a', encoding='utf-8')
+        _rebuild_indexes()
+        _LOADED = True
+
+def _atomic_write_json(path: str, data: Any) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fsync = _fsync_enabled()
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        # Persist the rename itself; not possible on every platform
+        try:
+            fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+@timed("state_snapshot")
+def _write_snapshot(predictions: Any, consults: Any, users: Any) -> None:
+    _atomic_write_json(_pred_path(), predictions)
+    _atomic_write_json(_consult_path(), consults)
+    _atomic_write_json(_users_path(), users)
+
+def _collection_path(coll: str) -> str:
+    return {"predictions": _pred_path, "consults": _consult_path, "users": _users_path}[coll]()
+
+def _collection_copy(coll: str) -> Any:
+    """Shallow copy that can be serialized outside _lock. Caller holds _lock."""
+    if coll == "predictions":
+        return dict(_PREDICTIONS)
+    if coll == "consults":
+        return list(_CONSULTS)
+    return dict(_USERS)
+
+@timed("state_flush")
+def _flush(snapshot: Dict[str, Any]) -> None:
+    """Write each collection in `snapshot` ({name: data}) atomically."""
+    for coll, data in snapshot.items():
+        try:
+            _atomic_write_json(_collection_path(coll), data)
+        except Exception:
+            pass
+
+
+class _SnapshotWriter:
+    """Background group-commit flusher for snapshot mode.
+
+    mark() records a dirty collection and returns a sequence number; a flush
+    takes every dirty collection at once, writes it outside _lock and then
+    publishes the highest sequence it covered, which is what wait() blocks on.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one snapshot write at a time, in order
+        self._dirty: set = set()
+        self._requested = 0
+        self._committed = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def mark(self, coll: str) -> int:
+        with self._cond:
+            self._dirty.add(coll)
+            self._requested += 1
+            self._ensure_thread()
+            self._cond.notify_all()
+            return self._requested
+
+    def _ensure_thread(self) -> None:
+        """(Re)start the flusher if it is not running. Caller holds _cond."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="state-flush", daemon=True)
+            self._thread.start()
+
+    def wait(self, seq: int) -> None:
+        with self._cond:
+            while self._committed < seq:
+                # Re-check periodically so a flusher that died cannot strand this save
+                if not self._cond.wait(timeout=1.0):
+                    self._ensure_thread()
+
+    def flush(self) -> None:
+        """Write whatever is dirty now. Must not be called with _lock held."""
+        with self._flush_lock:
+            seq = self._committed
+            try:
+                with _lock:
+                    with self._cond:
+                        colls, self._dirty = self._dirty, set()
+                        seq, covered = self._requested, self._requested - self._committed
+                    snapshot = {c: _collection_copy(c) for c in colls}
+                if snapshot:
+                    COMMIT_BATCH.observe(covered)
+                    _flush(snapshot)
+            finally:
+                # Release waiters even if the write failed; _flush already swallows I/O errors
+                with self._cond:
+                    self._committed = max(self._committed, seq)
+                    self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            # Nothing may end this loop: waiters depend on it (wait() restarts it as a backstop)
+            try:
+                if _durability() == "interval":
+                    time.sleep(_flush_interval())
+                else:
+                    # Let concurrent saves join this commit
+                    window = _group_commit_window()
+                    if window > 0:
+                        time.sleep(window)
+            except Exception:
+                pass
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+_writer = _SnapshotWriter()
+atexit.register(_writer.flush)
+
+@timed("state_journal_append")
+def _append(coll: str, *records: Dict[str, Any]) -> None:
+    """Append one journal entry per record with a single write. Caller holds _lock."""
+    global _journal_fh, _journal_ops, _compacting
     try:
-        with open(_consult_path(), 'w', encoding='utf-8') as f:
-            json.dump(_CONSULTS, f, indent=2)
+        if _journal_fh is None or _journal_fh.closed:
+            _journal_fh = open(_journal_path(), 'a', encoding='utf-8')
+        _journal_fh.write("".join(
+            json.dumps({"c": coll, "r": r}, separators=(",", ":")) + "\n" for r in records
+        ))
+        _journal_fh.flush()
+        if os.getenv("STATE_JOURNAL_FSYNC", "0").lower() in ("1", "true", "yes"):
+            os.fsync(_journal_fh.fileno())
     except Exception:
         pass
+    _journal_ops += len(records)
+    if _journal_ops >= _compact_threshold() and not _compacting:
+        _compacting = True
+        threading.Thread(target=_compact, name="state-compact", daemon=True).start()
+
+def _persist(coll: str, *records: Dict[str, Any]) -> Optional[int]:
+    """Make just-applied writes durable. Caller holds _lock and then, after
+    releasing it, passes the result to _await_durable().
+    """
+    if _JOURNAL:
+        _append(coll, *records)
+        return None
+    mode = _durability()
+    if mode == "write":
+        _flush({coll: _collection_copy(coll)})
+        return None
+    seq = _writer.mark(coll)
+    return seq if mode == "batch" else None
+
+def _await_durable(seq: Optional[int]) -> None:
+    if seq is not None:
+        _writer.wait(seq)
+
+def _compact() -> None:
+    """Fold the journal into a fresh snapshot without blocking writers.
+
+    The live journal is rotated to journal.jsonl.compacting under the lock,
+    the snapshot is written outside it, and the rotated file is removed only
+    once the snapshot has been atomically renamed into place.
+    """
+    global _journal_fh, _journal_ops, _compacting
     try:
-        with open(_users_path(), 'w', encoding='utf-8') as f:
-            json.dump(_USERS, f, indent=2)
+        with _lock:
+            if os.path.exists(_compacting_path()):
+                # Leftover from a crashed compaction; fold it in with this one
+                with open(_compacting_path(), 'a', encoding='utf-8') as dst, \
+                        open(_journal_path(), 'r', encoding='utf-8') as src:
+                    dst.write(src.read())
+                _journal_fh.close()
+                os.remove(_journal_path())
+            else:
+                _journal_fh.close()
+                os.replace(_journal_path(), _compacting_path())
+            _journal_fh = open(_journal_path(), 'a', encoding='utf-8')
+            _journal_ops = 0
+            snapshot = (dict(_PREDICTIONS), list(_CONSULTS), dict(_USERS))
+        _write_snapshot(*snapshot)
+        os.remove(_compacting_path())
     except Exception:
         pass
+    finally:
+        _compacting = False
 
 
 def save_prediction(record: Dict[str, Any]) -> str:
     """Store a prediction record and return its id."""
-    _load()
     pid = record.get("id") or str(uuid.uuid4())
     record["id"] = pid
     record.setdefault("created_at", datetime.utcnow().isoformat())
+    store = _sqlite()
+    if store is not None:
+        store.save_prediction(record)
+        return pid
+    _load()
     with _lock:
-        _PREDICTIONS[pid] = record
-        _flush()
+        _put_prediction(record)
+        seq = _persist("predictions", record)
+    _await_durable(seq)
     return pid
 
 
+def save_predictions(records: List[Dict[str, Any]]) -> List[str]:
+    """Store several prediction records with one store write; returns their ids in order."""
+    now = datetime.utcnow().isoformat()
+    for record in records:
+        record["id"] = record.get("id") or str(uuid.uuid4())
+        record.setdefault("created_at", now)
+    if not records:
+        return []
+    store = _sqlite()
+    if store is not None:
+        store.save_predictions(records)
+        return [r["id"] for r in records]
+    _load()
+    with _lock:
+        for record in records:
+            _put_prediction(record)
+        seq = _persist("predictions", *records)
+    _await_durable(seq)
+    return [r["id"] for r in records]
+
+
 def get_prediction(pid: str) -> Optional[Dict[str, Any]]:
+    store = _sqlite()
+    if store is not None:
+        return store.get_prediction(pid)
     _load()
     with _lock:
         return _PREDICTIONS.get(pid)
 
-def list_predictions(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Return list of stored predictions, optionally filtered by user_id, newest first."""
+def _prediction_entries(user_id: Optional[str], anonymous: bool) -> List[Tuple[str, str]]:
+    """Caller holds _lock."""
+    if anonymous:
+        return _PRED_BY_USER.get("", [])
+    return _PRED_BY_USER.get(user_id, []) if user_id else _PRED_ORDER
+
+def list_predictions(
+    user_id: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[str, str]] = None,
+    since: Optional[str] = None,
+    anonymous: bool = False,
+) -> List[Dict[str, Any]]:
+    """Return list of stored predictions, optionally filtered by user_id, newest first.
+
+    `before` is a (created_at, id) cursor (exclusive), `since` keeps only records
+    created strictly after that timestamp, and `limit` caps the page size.
+    `anonymous` keeps only records saved without a user_id.
+    """
+    store = _sqlite()
+    if store is not None:
+        return store.list_predictions(user_id, limit=limit, before=before, since=since, anonymous=anonymous)
+    _load()
+    with _lock:
+        entries = _prediction_entries(user_id, anonymous)
+        hi = bisect.bisect_left(entries, tuple(before)) if before else len(entries)
+        lo = bisect.bisect_right(entries, (since, chr(0x10FFFF))) if since else 0
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return [_PREDICTIONS[pid] for _, pid in reversed(entries[lo:hi])]
+
+def predictions_version(user_id: Optional[str] = None, anonymous: bool = False) -> str:
+    """Cheap fingerprint of a user's prediction history (count + newest entry), for ETags."""
+    store = _sqlite()
+    if store is not None:
+        return store.predictions_version(user_id, anonymous=anonymous)
     _load()
     with _lock:
-        vals = list(_PREDICTIONS.values())
-    if user_id:
-        vals = [r for r in vals if (r.get('user_id') == user_id)]
-    vals.sort(key=lambda r: r.get('created_at') or '', reverse=True)
-    return vals
+        entries = _prediction_entries(user_id, anonymous)
+        newest = entries[-1] if entries else ("", "")
+        return f"{len(entries)}:{newest[0]}:{newest[1]}"
 
 def save_consult(record: Dict[str, Any]) -> str:
     """Store a mock consult scheduling/send action and return id."""
-    _load()
     cid = record.get("id") or str(uuid.uuid4())
     record["id"] = cid
     record.setdefault("created_at", datetime.utcnow().isoformat())
+    store = _sqlite()
+    if store is not None:
+        store.save_consult(record)
+        return cid
+    _load()
     with _lock:
+        old = _CONSULT_BY_ID.get(cid)
+        if old is not None:
+            _unindex_consult(old)
+            _CONSULTS[:] = [c for c in _CONSULTS if c.get("id") != cid]
         _CONSULTS.append(record)
-        _flush()
+        _index_consult(record)
+        seq = _persist("consults", record)
+    _await_durable(seq)
     return cid
 
-def list_consults(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+def list_consults(
+    user_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    prediction_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Return consults newest first, optionally filtered by user, doctor and/or prediction."""
+    store = _sqlite()
+    if store is not None:
+        return store.list_consults(user_id, doctor_id=doctor_id, prediction_id=prediction_id)
     _load()
+    filters = {k: v for k, v in (("user_id", user_id), ("doctor_id", doctor_id), ("prediction_id", prediction_id)) if v}
     with _lock:
-        vals = list(_CONSULTS)
-    if user_id:
-        vals = [r for r in vals if (r.get('user_id') == user_id)]
-    vals.sort(key=lambda r: r.get('created_at') or '', reverse=True)
-    return vals
+        if not filters:
+            return [_CONSULT_BY_ID[cid] for _, cid in reversed(_CONSULT_ORDER)]
+        # Walk the smallest matching index and check the remaining filters
+        field, key = min(filters.items(), key=lambda kv: len(_CONSULT_INDEX[kv[0]].get(kv[1], [])))
+        out = []
+        for _, cid in reversed(_CONSULT_INDEX[field].get(key, [])):
+            rec = _CONSULT_BY_ID[cid]
+            if all(rec.get(f) == v for f, v in filters.items()):
+                out.append(rec)
+        return out
 
 # Users store
 def save_user(user: Dict[str, Any]) -> str:
-    _load()
     uid = user.get("id") or str(uuid.uuid4())
     user["id"] = uid
     user.setdefault("created_at", datetime.utcnow().isoformat())
+    store = _sqlite()
+    if store is not None:
+        store.save_user(user)
+        return uid
+    _load()
     with _lock:
         # Prevent duplicate emails
-        for u in _USERS.values():
-            if u.get("email") == user.get("email"):
-                raise ValueError("email already exists")
+        owner = _EMAIL_INDEX.get(user.get("email"))
+        if owner is not None and owner != uid:
+            raise ValueError("email already exists")
+        old = _USERS.get(uid)
+        if old is not None and old.get("email") != user.get("email"):
+            _EMAIL_INDEX.pop(old.get("email"), None)
         _USERS[uid] = user
-        _flush()
+        _index_user(user)
+        seq = _persist("users", user)
+    _await_durable(seq)
     return uid
 
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    store = _sqlite()
+    if store is not None:
+        return store.get_user_by_email(email)
     _load()
     with _lock:
-        for u in _USERS.values():
-            if u.get("email") == email:
-                return u
-    return None
+        uid = _EMAIL_INDEX.get(email)
+        return _USERS.get(uid) if uid is not None else None
 
 def list_users() -> List[Dict[str, Any]]:
+    store = _sqlite()
+    if store is not None:
+        return store.list_users()
     _load()
     with _lock:
         return list(_USERS.values())
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import socket
+import threading
+import time
+
+# Load generation and reporting. A target exposes request(method, path, **kw)
+# returning the HTTP status; run_load() drives it from a thread pool and
+# summarize() turns the per-request latencies into the JSON result row.
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(
+    scenario: str,
+    transport: str,
+    latencies: List[float],
+    errors: int,
+    wall: float,
+    concurrency: int,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    lat = sorted(latencies)
+    ms = lambda s: round(s * 1000.0, 3)  # noqa: E731
+    row = {
+        "scenario": scenario,
+        "transport": transport,
+        "requests": len(lat),
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(wall, 4),
+        "throughput_rps": round(len(lat) / wall, 2) if wall > 0 else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(lat, 50)),
+            "p95": ms(percentile(lat, 95)),
+            "p99": ms(percentile(lat, 99)),
+            "mean": ms(sum(lat) / len(lat)) if lat else 0.0,
+            "max": ms(lat[-1]) if lat else 0.0,
+        },
+    }
+    if extra:
+        row.update(extra)
+    return row
+
+
+def run_load(send: Callable[[Any], bool], payloads: Sequence[Any], concurrency: int, warmup: int = 0):
+    """Call send(payload) for every payload from `concurrency` threads.
+    `send` returns True on success. The first `warmup` payloads run sequentially
+    and are not measured. Returns (latencies, errors, wall_seconds).
+    """
+    for p in payloads[:warmup]:
+        send(p)
+    measured = payloads[warmup:]
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(p: Any) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = send(p)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(one, measured))
+    return latencies, errors, time.perf_counter() - started
+
+
+class InProcessTarget:
+    """Drives the ASGI app through Starlette's TestClient (no sockets; lifespan runs)."""
+
+    name = "inprocess"
+
+    def __init__(self, app):
+        from fastapi.testclient import TestClient
+
+        self._client = TestClient(app)
+
+    def __enter__(self) -> "InProcessTarget":
+        self._client.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._client.__exit__(*exc)
+
+    def request(self, method: str, path: str, **kw) -> int:
+        return self._client.request(method, path, **kw).status_code
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class UvicornTarget:
+    """Serves the app with uvicorn on a local port and sends real HTTP requests
+    over keep-alive connections (one requests.Session per client thread).
+    """
+
+    name = "uvicorn"
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.port = _free_port()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="bench-uvicorn", daemon=True)
+        self._local = threading.local()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "UvicornTarget":
+        self._thread.start()
+        deadline = time.time() + 30
+        while not self._server.started:
+            if time.time() > deadline or not self._thread.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            import requests
+
+            s = self._local.session = requests.Session()
+        return s
+
+    def request(self, method: str, path: str, **kw) -> int:
+        return self._session().request(method, self.base_url + path, timeout=120, **kw).status_code
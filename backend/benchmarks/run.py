@@ -0,0 +1,217 @@
+"""CareMate benchmark suite.
+
+Run from backend/:
+
+    python -m benchmarks.run                          # every scenario, in-process and via uvicorn
+    python -m benchmarks.run -s predict_heuristic -s login -t inprocess -n 500 -c 16
+    python -m benchmarks.run --gemini-latency 0.2 --out bench.json
+
+Each scenario runs in a fresh subprocess with its own temporary DATA_DIR, so
+module-level state (store, caches, loaded models) never leaks between runs.
+Gemini calls go to the local stub from app.gemini.stub_server with the given
+latency (--gemini-latency -1 leaves Gemini unconfigured, i.e. the mock
+explanations). Result caches are disabled so every request does full work.
+
+Output is JSON: {"meta": {...}, "results": [{"scenario", "transport",
+"requests", "errors", "throughput_rps", "latency_ms": {"p50", "p95", "p99",
+"mean", "max"}, ...}]}, suitable for diffing run to run.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ["predict_heuristic", "predict_model", "dashboard_10k", "dashboard_100k", "login", "pdf"]
+TRANSPORTS = ["inprocess", "uvicorn"]
+# Scenarios that exercise a function rather than an HTTP route
+FUNCTION_SCENARIOS = {"pdf"}
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _configure_env(args: argparse.Namespace, data_dir: str) -> None:
+    """Environment for the app under test; must run before anything imports `app`."""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["REPORTS_DIR"] = os.path.join(data_dir, "reports")
+    os.environ["STATE_BACKEND"] = args.state_backend
+    os.environ["MODEL_DIR"] = os.path.join(data_dir, "models")
+    os.environ["GEMINI_CACHE_SIZE"] = "0"
+    os.environ["PREDICT_CACHE_SIZE"] = "0"
+    os.environ["REPORT_PREWARM"] = "1" if args.prewarm else "0"
+    os.environ["GEMINI_API_KEY"] = ""
+
+
+def _start_gemini_stub(latency: float) -> None:
+    if latency < 0:
+        return
+    from app.gemini.stub_server import StubConfig, start_stub
+
+    server, _ = start_stub(config=StubConfig(latency=latency))
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["GEMINI_API_KEY"] = "bench-stub-key"
+
+
+def _make_target(transport: str, app):
+    from .harness import InProcessTarget, UvicornTarget
+
+    return InProcessTarget(app) if transport == "inprocess" else UvicornTarget(app)
+
+
+def _run_scenario(args: argparse.Namespace) -> Dict[str, Any]:
+    from . import synthetic
+    from .harness import run_load, summarize
+
+    scenario, transport, n, conc = args.worker, args.transport, args.requests, args.concurrency
+    data_dir = tempfile.mkdtemp(prefix=f"caremate-bench-{scenario}-")
+    _configure_env(args, data_dir)
+    sys.path.insert(0, _BACKEND_DIR)
+    _start_gemini_stub(args.gemini_latency)
+    extra: Dict[str, Any] = {"gemini_latency_s": args.gemini_latency}
+
+    if scenario == "pdf":
+        import io
+        import random
+        from datetime import datetime
+        from app.reports.pdf_generator import write_pdf
+
+        rng = random.Random(5)
+        records = [synthetic.prediction_record(rng, "bench", datetime(2024, 1, 1)) for _ in range(32)]
+
+        def send(i: int) -> bool:
+            buf = io.BytesIO()
+            write_pdf(records[i % len(records)], buf)
+            return buf.tell() > 0
+
+        lat, errors, wall = run_load(send, list(range(n + args.warmup)), conc, warmup=args.warmup)
+        return summarize(scenario, "function", lat, errors, wall, conc, extra)
+
+    if scenario == "predict_model":
+        synthetic.train_models(os.environ["MODEL_DIR"])
+    if scenario.startswith("dashboard_"):
+        count = int(scenario.split("_")[1].replace("k", "000"))
+        t0 = time.perf_counter()
+        synthetic.seed_predictions(count)
+        extra.update({"stored_records": count, "seed_s": round(time.perf_counter() - t0, 3)})
+
+    from app.main import app
+    from app.api.auth import create_access_token
+
+    def bearer(user_id: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+    with _make_target(transport, app) as target:
+        if scenario.startswith("predict_"):
+            payloads = synthetic.intakes(n + args.warmup)
+            headers = bearer("bench-user")
+
+            def send(body: Dict[str, Any]) -> bool:
+                return target.request("POST", "/predict", json=body, headers=headers) == 200
+
+        elif scenario.startswith("dashboard_"):
+            tokens = [bearer(f"bench-user-{i}") for i in range(100)]
+            payloads = [tokens[i % 100] for i in range(n + args.warmup)]
+
+            def send(headers: Dict[str, str]) -> bool:
+                return target.request("GET", "/dashboard", params={"limit": 50}, headers=headers) == 200
+
+        elif scenario == "login":
+            creds = {"email": "bench@example.com", "password": "bench-password"}
+            status = target.request("POST", "/signup", json={**creds, "name": "Bench"})
+            if status not in (200, 409):
+                raise RuntimeError(f"signup failed with {status}")
+            payloads = [creds] * (n + args.warmup)
+
+            def send(body: Dict[str, Any]) -> bool:
+                return target.request("POST", "/login", json=body) == 200
+
+        else:
+            raise SystemExit(f"unknown scenario {scenario!r}")
+
+        lat, errors, wall = run_load(send, payloads, conc, warmup=args.warmup)
+    return summarize(scenario, transport, lat, errors, wall, conc, extra)
+
+
+def _spawn(args: argparse.Namespace, scenario: str, transport: str) -> Dict[str, Any]:
+    cmd = [
+        sys.executable, "-m", "benchmarks.run",
+        "--worker", scenario, "--transport", transport,
+        "-n", str(args.requests), "-c", str(args.concurrency), "--warmup", str(args.warmup),
+        "--gemini-latency", str(args.gemini_latency), "--state-backend", args.state_backend,
+    ]
+    if args.prewarm:
+        cmd.append("--prewarm")
+    proc = subprocess.run(cmd, cwd=_BACKEND_DIR, capture_output=True, text=True)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        return {"scenario": scenario, "transport": transport, "error": (proc.stderr or proc.stdout).strip()[-2000:]}
+    return json.loads(lines[-1])
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=_BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="CareMate benchmarks")
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="repeatable; default: all")
+    parser.add_argument("-t", "--transport", action="append", choices=TRANSPORTS, help="repeatable; default: both")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests sent first")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="stub latency in seconds; -1 disables Gemini")
+    parser.add_argument("--state-backend", default="json", choices=["json", "sqlite"])
+    parser.add_argument("--prewarm", action="store_true", help="keep background report pre-rendering on")
+    parser.add_argument("--out", help="write results JSON here instead of stdout")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        args.transport = (args.transport or ["inprocess"])[0]
+        print(json.dumps(_run_scenario(args)), flush=True)
+        return 0
+
+    results = []
+    for scenario in args.scenario or SCENARIOS:
+        transports = ["function"] if scenario in FUNCTION_SCENARIOS else (args.transport or TRANSPORTS)
+        for transport in transports:
+            row = _spawn(args, scenario, "inprocess" if transport == "function" else transport)
+            results.append(row)
+            print(f"{scenario:<18} {row.get('transport', transport):<10} "
+                  + (f"{row['throughput_rps']:>9.1f} rps  p50 {row['latency_ms']['p50']:.1f} ms  "
+                     f"p95 {row['latency_ms']['p95']:.1f} ms  p99 {row['latency_ms']['p99']:.1f} ms"
+                     if "error" not in row else "FAILED"),
+                  file=sys.stderr, flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("worker", "out")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import os
+import random
+
+# Synthetic inputs for the benchmarks: intake payloads shaped like HealthIntake,
+# stored prediction records for seeding /dashboard, and small sklearn models
+# trained on random data so the "real model" path (predict_proba + SHAP) runs.
+
+SYMPTOMS = ["Headache", "Fatigue", "Thirst", "Chest pain", "Dizziness", "Swelling", "Blurred vision", "Nausea"]
+SEXES = ["male", "female", "other"]
+
+
+def intake(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "age": rng.randint(18, 90),
+        "sex": rng.choice(SEXES),
+        "height": round(rng.uniform(150, 195), 1),
+        "weight": round(rng.uniform(45, 120), 1),
+        "systolic": rng.randint(95, 190),
+        "diastolic": rng.randint(60, 120),
+        "glucose": rng.randint(70, 260),
+        "symptoms": rng.sample(SYMPTOMS, rng.randint(0, 3)),
+        "labsUploaded": rng.random() < 0.3,
+        "wearableImported": rng.random() < 0.2,
+    }
+
+
+def intakes(n: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [intake(rng) for _ in range(n)]
+
+
+def prediction_record(rng: random.Random, user_id: str, created_at: datetime) -> Dict[str, Any]:
+    from app.api.predict import DISEASE_LABELS, DISEASES
+
+    preds = []
+    for key in DISEASES:
+        p = rng.random()
+        preds.append({
+            "disease": DISEASE_LABELS[key],
+            "probability": p,
+            "risk_band": "high" if p >= 0.67 else "medium" if p >= 0.34 else "low",
+            "top_features": ["glucose", "age", "systolic"],
+            "recommendations": ["Track your readings"],
+            "explanation": "Synthetic benchmark record.",
+        })
+    return {
+        "intake": intake(rng),
+        "predictions": preds,
+        "user_id": user_id,
+        "created_at": created_at.isoformat(),
+    }
+
+
+def seed_predictions(n: int, users: int = 100, seed: int = 11) -> List[str]:
+    """Store `n` records spread over `users` users (bench-user-0 .. N) with one bulk write.
+    Must run after DATA_DIR / STATE_BACKEND are set for the benchmark process.
+    """
+    from app.utils.state import save_predictions
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    records = [
+        prediction_record(rng, f"bench-user-{i % users}", start + timedelta(seconds=i))
+        for i in range(n)
+    ]
+    return save_predictions(records)
+
+
+def train_models(model_dir: str, n_samples: int = 2000, seed: int = 3) -> None:
+    """Fit one small RandomForest per disease on random features and save them as
+    <disease>.joblib, the layout app.utils.model_loader expects.
+    """
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from app.api.predict import DISEASES, FEATURE_NAMES
+
+    os.makedirs(model_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n_samples, len(FEATURE_NAMES)))
+    for i, name in enumerate(DISEASES):
+        y = (x[:, i] + 0.5 * x[:, -1] + rng.normal(scale=0.5, size=n_samples) > 0).astype(int)
+        model = RandomForestClassifier(n_estimators=50, max_depth=6, random_state=seed + i, n_jobs=1)
+        model.fit(x, y)
+        joblib.dump(model, os.path.join(model_dir, f"{name}.joblib"))
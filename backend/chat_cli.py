@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
@@ -7,8 +8,8 @@ from dotenv import load_dotenv
 HERE = Path(__file__).resolve().parent
 sys.path.insert(0, str(HERE))
 
-from app.api.ai_chat import ChatResponse  # type: ignore
-from app.gemini.gemini_client import _call_gemini_api  # type: ignore
+from app.api.ai_chat import FALLBACK_REPLY  # type: ignore
+from app.gemini.gemini_client import stream_gemini_api_async  # type: ignore
 
 load_dotenv()
 
@@ -19,8 +20,25 @@ PROMPT_TEMPLATE = (
     "Assistant:"
 )
 
+async def _print_reply(prompt: str) -> None:
+    streamed = False
+    # Print tokens as they arrive; fall back to the canned reply if nothing streams
+    async for chunk in stream_gemini_api_async(prompt):
+        streamed = True
+        print(chunk, end="", flush=True)
+    if not streamed:
+        print(FALLBACK_REPLY, end="", flush=True)
+
 def run_cli() -> int:
     print("Gemini CLI (type 'exit' to quit)\n", flush=True)
+    # One loop for the whole session so the HTTP connection pool is reused between prompts
+    loop = asyncio.new_event_loop()
+    try:
+        return _repl(loop)
+    finally:
+        loop.close()
+
+def _repl(loop: asyncio.AbstractEventLoop) -> int:
     while True:
         try:
             user = input('You > ').strip()
@@ -32,13 +50,9 @@ def run_cli() -> int:
         if user.lower() in {"exit", "quit"}:
             return 0
         prompt = PROMPT_TEMPLATE.format(text=user)
-        reply = _call_gemini_api(prompt)
-        if not reply:
-            reply = (
-                "I hear you—thanks for sharing. Consider rest, hydration, and noting your key symptoms. "
-                "If symptoms persist beyond 48–72 hours, or you notice warning signs (severe pain, trouble breathing, confusion), seek in-person care."
-            )
-        print(f"AI  > {reply}\n", flush=True)
+        print("AI  > ", end="", flush=True)
+        loop.run_until_complete(_print_reply(prompt))
+        print("\n", flush=True)
 
 if __name__ == '__main__':
     raise SystemExit(run_cli())
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+# Keep the suite away from backend/.env and the real data dir: load_dotenv()
+# never overrides variables that are already set.
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="caremate-test-"))
+os.environ.setdefault("REPORTS_DIR", os.path.join(os.environ["DATA_DIR"], "reports"))
+os.environ.setdefault("REPORT_PREWARM", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def state_store(tmp_path, monkeypatch):
+    """app.utils.state pointed at an empty DATA_DIR; returns (module, reload)
+    where reload() drops the in-memory copy so the next call reads the disk.
+    """
+    from app.utils import state
+
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    for name in ("STATE_BACKEND", "STATE_JOURNAL", "STATE_DURABILITY", "STATE_DB_PATH"):
+        monkeypatch.delenv(name, raising=False)
+
+    def reload():
+        state._writer.flush()
+        if state._journal_fh is not None:
+            state._journal_fh.close()
+            state._journal_fh = None
+        state._LOADED = False
+        state._SQLITE = None
+
+    reload()
+    yield state, reload
+    reload()
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from app.gemini.admission import AdmissionController
+from app.gemini.transport import CircuitBreaker
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial call at a time
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_and_released_trial_frees_the_slot():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_status_reflects_breaker_and_disabled(monkeypatch):
+    from app.gemini import transport
+
+    controller = AdmissionController()
+    assert controller.status() == "disabled"
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(transport, "_breaker", CircuitBreaker(threshold=1, cooldown=60))
+    assert controller.status() == "ok"
+    transport.get_breaker().record_failure()
+    assert controller.status() == "open"
+
+
+def test_full_queue_is_shed_at_once(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    controller = AdmissionController(max_concurrency=1, max_queue=0, queue_budget=1.0)
+
+    async def run():
+        async with controller.admit_async() as first:
+            async with controller.admit_async() as second:
+                return first, second, controller.status()
+
+    first, second, status = asyncio.run(run())
+    assert first and not second
+    assert status == "shedding" and controller.reason == "queue_full"
+    assert controller.in_flight == 0 and controller.waiting == 0
+
+
+def test_queue_budget_times_out(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    controller = AdmissionController(max_concurrency=1, max_queue=4, queue_budget=0.02)
+
+    async def run():
+        async with controller.admit_async() as first:
+            async with controller.admit_async() as second:
+                return first, second
+
+    assert asyncio.run(run()) == (True, False)
+    assert controller.reason == "queue_timeout"
+    assert controller.in_flight == 0 and controller.waiting == 0
+
+
+def test_latency_slo_breach_degrades_until_cooldown(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    controller = AdmissionController(latency_slo=0.001, cooldown=0.1, window=10)
+
+    async def call():
+        async with controller.admit_async() as ok:
+            if ok:
+                await asyncio.sleep(0.002)
+            return ok
+
+    async def run():
+        admitted = [await call() for _ in range(10)]
+        return admitted, await call()
+
+    admitted, refused = asyncio.run(run())
+    assert all(admitted) and not refused
+    assert controller.status() == "degraded" and controller.reason == "latency_slo"
+    time.sleep(0.11)
+    assert not controller.degraded()
+    assert asyncio.run(call())
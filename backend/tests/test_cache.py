@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+
+import joblib
+import pytest
+
+from app.api import predict
+from app.schemas.intake import HealthIntake
+from app.utils import model_loader
+from app.utils.cache import TTLCache
+
+
+def test_ttl_cache_evicts_lru_and_expires():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    cache.set("short", 4, ttl=-1)
+    assert cache.get("short") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(max_entries=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart_and_is_capped(tmp_path):
+    cache = TTLCache(max_entries=1, ttl=60, disk_dir=str(tmp_path), disk_max_entries=10)
+    for i in range(11):
+        cache.set(f"k{i}", i)
+    assert len(os.listdir(tmp_path)) <= 10
+    assert TTLCache(max_entries=1, ttl=60, disk_dir=str(tmp_path)).get("k10") == 10
+
+
+def _intake(**kw):
+    base = dict(age=40, sex="male", height=170, weight=70, systolic=120, diastolic=80, glucose=100, symptoms=["cough"])
+    base.update(kw)
+    return HealthIntake(**base)
+
+
+def _key(intake, versions):
+    x, _ = predict._build_feature_matrix([intake])
+    return predict._intake_key(intake, x[0], versions)
+
+
+def test_intake_key_ignores_flags_but_not_features_or_versions():
+    versions = {"diabetes": "1.0-10", "heart": None, "kidney": None}
+    base = _key(_intake(), versions)
+    assert _key(_intake(labsUploaded=True, wearableImported=True), versions) == base
+    assert _key(_intake(glucose=101), versions) != base
+    assert _key(_intake(symptoms=["fever"]), versions) != base
+    assert _key(_intake(), {**versions, "diabetes": "2.0-10"}) != base
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_RELOAD_INTERVAL_S", "0.01")
+    yield str(tmp_path)
+    model_loader._MODEL_CACHE.pop("diabetes", None)
+    model_loader._MODEL_META.pop("diabetes", None)
+
+
+def test_model_version_follows_reloads(model_dir):
+    path = os.path.join(model_dir, "diabetes.joblib")
+    joblib.dump({"weights": [1]}, path)
+    old = model_loader.get_model(model_dir, "diabetes")
+    version = model_loader.model_version("diabetes", old)
+    assert version is not None
+    assert predict._model_versions({"diabetes": old, "heart": None}) == {"diabetes": version, "heart": None}
+
+    joblib.dump({"weights": [1, 2, 3]}, path)
+    time.sleep(0.02)
+    new = model_loader.get_model(model_dir, "diabetes")
+    assert new is not old
+    assert model_loader.model_version("diabetes", old) is None
+    assert model_loader.model_version("diabetes", new) not in (None, version)
+    # A request still holding the swapped-out model must not be cached
+    assert predict._model_versions({"diabetes": old}) is None
+
+
+@pytest.fixture
+def result_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(predict, "_result_cache", TTLCache(max_entries=16, ttl=60))
+    return predict._result_cache
+
+
+def _explained_by(monkeypatch, source):
+    async def explain(items, deadline=None):
+        return ["text"] * len(items), [source] * len(items)
+
+    monkeypatch.setattr(predict, "get_doctor_explanations_with_sources_async", explain)
+
+
+@pytest.mark.parametrize(
+    "api_key,source,cached",
+    [
+        ("test", "gemini", True),
+        ("test", "deadline", False),
+        ("test", "fallback", False),  # shed or breaker open: retry Gemini next time
+        ("", "fallback", True),  # Gemini disabled: the mock text is the answer
+    ],
+)
+def test_only_final_explanations_are_cached(result_cache, monkeypatch, api_key, source, cached):
+    monkeypatch.setenv("GEMINI_API_KEY", api_key)
+    _explained_by(monkeypatch, source)
+    _, mocked = asyncio.run(predict._score([_intake()]))
+    assert (result_cache.stats()["size"] == 1) is cached
+    assert mocked == [source != "gemini"]
+    if cached:
+        asyncio.run(predict._score([_intake()]))
+        assert result_cache.stats()["hits"] == 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.utils.idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+
+
+def test_completed_response_is_replayed():
+    store = IdempotencyStore()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    fp = fingerprint({"age": 40})
+    assert store.run("k", fp, fn) == ({"n": 1}, False)
+    assert store.run("k", fp, fn) == ({"n": 1}, True)
+    assert len(calls) == 1 and store.stats()["replays"] == 1
+
+
+def test_key_reused_for_another_payload_is_rejected():
+    store = IdempotencyStore()
+    store.run("k", fingerprint({"age": 40}), lambda: 1)
+    with pytest.raises(IdempotencyConflict) as exc:
+        store.run("k", fingerprint({"age": 41}), lambda: 2)
+    assert exc.value.status_code == 422
+
+
+def test_failures_are_not_stored():
+    store = IdempotencyStore()
+
+    def boom():
+        raise RuntimeError("upstream")
+
+    with pytest.raises(RuntimeError):
+        store.run("k", "fp", boom)
+    assert store.run("k", "fp", lambda: "ok") == ("ok", False)
+
+
+def test_expired_entries_run_again():
+    store = IdempotencyStore(ttl=-1)
+    store.run("k", "fp", lambda: 1)
+    assert store.run("k", "fp", lambda: 2) == (2, False)
+
+
+def test_concurrent_requests_share_one_run():
+    store = IdempotencyStore()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def run():
+        return await asyncio.gather(store.run_async("k", "fp", fn), store.run_async("k", "fp", fn))
+
+    assert sorted(asyncio.run(run()), key=lambda r: r[1]) == [("done", False), ("done", True)]
+    assert len(calls) == 1 and store.stats()["coalesced"] == 1
+
+
+def test_in_flight_key_with_another_payload_conflicts():
+    store = IdempotencyStore()
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return 1
+
+    async def run():
+        owner = asyncio.ensure_future(store.run_async("k", "a", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(IdempotencyConflict) as exc:
+            await store.run_async("k", "b", slow)
+        await owner
+        return exc.value.status_code
+
+    assert asyncio.run(run()) == 409
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+
+import pytest
+
+MODES = {
+    "write": {"STATE_DURABILITY": "write"},
+    "batch": {"STATE_DURABILITY": "batch"},
+    "interval": {"STATE_DURABILITY": "interval", "STATE_FLUSH_INTERVAL_S": "0.05"},
+    "journal": {"STATE_JOURNAL": "1"},
+    "sqlite": {"STATE_BACKEND": "sqlite"},
+}
+
+
+@pytest.fixture(params=sorted(MODES))
+def store(request, state_store, monkeypatch):
+    for key, value in MODES[request.param].items():
+        monkeypatch.setenv(key, value)
+    return state_store
+
+
+def test_saved_predictions_survive_a_reload(store):
+    state, reload = store
+    pid = state.save_prediction({"user_id": "u1", "predictions": []})
+    ids = state.save_predictions([{"user_id": "u1"}, {"user_id": "u2"}])
+    reload()
+    assert state.get_prediction(pid)["user_id"] == "u1"
+    assert [r["id"] for r in state.list_predictions("u1")] == [ids[0], pid]
+    assert [r["id"] for r in state.list_predictions("u2")] == [ids[1]]
+
+
+def test_anonymous_listing_excludes_user_records(store):
+    state, _ = store
+    mine = state.save_prediction({"user_id": "u1"})
+    anon = state.save_prediction({})
+    assert [r["id"] for r in state.list_predictions(anonymous=True)] == [anon]
+    assert {r["id"] for r in state.list_predictions()} == {mine, anon}
+    before = state.predictions_version(anonymous=True)
+    state.save_prediction({"user_id": "u1"})
+    assert state.predictions_version(anonymous=True) == before
+
+
+def test_users_are_unique_by_email_and_updatable(store):
+    state, reload = store
+    uid = state.save_user({"email": "a@example.com", "password_hash": "x"})
+    with pytest.raises(ValueError):
+        state.save_user({"email": "a@example.com", "password_hash": "y"})
+    state.save_user({**state.get_user_by_email("a@example.com"), "password_hash": "z"})
+    reload()
+    user = state.get_user_by_email("a@example.com")
+    assert user["id"] == uid and user["password_hash"] == "z"
+
+
+def test_batch_mode_returns_only_once_on_disk(state_store, monkeypatch):
+    state, _ = state_store
+    monkeypatch.setenv("STATE_DURABILITY", "batch")
+    pids = []
+
+    def save():
+        pids.append(state.save_prediction({"user_id": "u"}))
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with open(os.path.join(os.environ["DATA_DIR"], "predictions.json"), encoding="utf-8") as f:
+        assert set(pids) <= set(json.load(f))
+
+
+def test_interval_mode_defers_the_write(state_store, monkeypatch):
+    state, _ = state_store
+    monkeypatch.setenv("STATE_DURABILITY", "interval")
+    monkeypatch.setenv("STATE_FLUSH_INTERVAL_S", "0.5")
+    pid = state.save_prediction({"user_id": "u"})
+    path = os.path.join(os.environ["DATA_DIR"], "predictions.json")
+    assert not os.path.exists(path)
+    state._writer.flush()
+    with open(path, encoding="utf-8") as f:
+        assert pid in json.load(f)
+
+
+def test_flusher_survives_bad_settings(state_store, monkeypatch):
+    state, reload = state_store
+    monkeypatch.setenv("STATE_DURABILITY", "batch")
+    monkeypatch.setenv("STATE_GROUP_COMMIT_MS", "not-a-number")
+    pid = state.save_prediction({"user_id": "u"})
+    reload()
+    assert state.get_prediction(pid) is not None